@@ -78,6 +78,7 @@ setup(
     entry_points={
         "console_scripts": [],
         "turberfield.ipc.poa": [
+            "multicast = turberfield.ipc.policy:POA.Multicast",
             "udp = turberfield.ipc.policy:POA.UDP",
         ],
         "turberfield.ipc.role": [
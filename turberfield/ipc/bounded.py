@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import Counter
+from enum import Enum
+import warnings
+import weakref
+
+
+class Overflow(Enum):
+    """
+    Policies for a :py:class:`BoundedQueue` which is full.
+
+    drop_oldest
+        Discard the item at the head of the queue to make room.
+    drop_newest
+        Discard the item being added.
+    pause
+        Stop reading from attached transports until the queue drains
+        to half its size. A queue attached to a transport which cannot
+        pause reading falls back to `drop_newest`.
+    block
+        Refuse the item. `put_nowait` raises `asyncio.QueueFull`, so the
+        caller knows; `put` waits for space.
+
+    """
+    block = "block"
+    drop_oldest = "drop_oldest"
+    drop_newest = "drop_newest"
+    pause = "pause"
+
+
+# Transport -> count of pauses
+paused = weakref.WeakKeyDictionary()
+
+def can_pause(transport):
+    """
+    Returns `True` if reading from a transport can be paused.
+
+    Before Python 3.11, datagram transports cannot pause reading.
+
+    """
+    try:
+        transport.is_reading()
+    except NotImplementedError:
+        return False
+    except AttributeError:
+        return hasattr(transport, "pause_reading")
+    return True
+
+def pause_reading(transport):
+    """
+    Stops reading from a transport. Reading resumes when each call has been
+    matched by a call to :py:func:`resume_reading`.
+
+    Raises `NotImplementedError` if the transport cannot pause reading.
+
+    """
+    count = paused.get(transport, 0)
+    if not count:
+        transport.pause_reading()
+    paused[transport] = count + 1
+
+def resume_reading(transport):
+    """
+    Undoes one call to :py:func:`pause_reading`.
+
+    """
+    count = paused.pop(transport, 0)
+    if count > 1:
+        paused[transport] = count - 1
+    elif count and not transport.is_closing():
+        transport.resume_reading()
+
+
+class BoundedQueue(asyncio.Queue):
+    """
+    An asyncio queue of fixed size which applies an overflow policy
+    when items are added without waiting.
+
+    Coroutines which `put` to the queue wait for space as usual.
+
+    :param maxsize: The capacity of the queue.
+    :param overflow: An :py:class:`Overflow` policy.
+
+    The attribute `hwm` records the greatest depth reached by the queue.
+    The attribute `stats` counts items dropped or refused, and times paused.
+
+    """
+
+    def __init__(self, maxsize=1024, overflow=Overflow.drop_oldest, *, loop=None):
+        if maxsize <= 0:
+            raise ValueError("BoundedQueue needs a positive maxsize.")
+        super().__init__(maxsize=maxsize, loop=loop)
+        self.overflow = overflow
+        self.transports = set([])
+        self.paused = False
+        self.hwm = 0
+        self.stats = Counter()
+
+    def attach(self, transport):
+        """
+        Registers a transport to be paused under the `pause` policy.
+
+        """
+        if self.overflow is Overflow.pause and not can_pause(transport):
+            self.unpausable()
+        self.transports.add(transport)
+
+    def detach(self, transport):
+        if transport in self.transports and self.paused:
+            resume_reading(transport)
+        self.transports.discard(transport)
+
+    def put_nowait(self, item):
+        if self.full():
+            if self.overflow is Overflow.block:
+                self.stats["refused"] += 1
+                raise asyncio.QueueFull()
+            elif self.overflow is Overflow.drop_oldest:
+                super().get_nowait()
+                self.stats["dropped"] += 1
+            else:
+                self.stats["dropped"] += 1
+                return
+
+        super().put_nowait(item)
+        self.hwm = max(self.hwm, self.qsize())
+
+        if self.overflow is Overflow.pause and self.full() and not self.paused:
+            self.paused = True
+            self.stats["paused"] += 1
+            for transport in self.transports:
+                try:
+                    pause_reading(transport)
+                except (AttributeError, NotImplementedError, OSError):
+                    self.unpausable()
+
+    def unpausable(self):
+        warnings.warn("Transport cannot pause reading. Dropping newest items instead.")
+        self.overflow = Overflow.drop_newest
+
+    def get_nowait(self):
+        rv = super().get_nowait()
+        if self.paused and self.qsize() <= self.maxsize // 2:
+            self.paused = False
+            for transport in self.transports:
+                resume_reading(transport)
+        return rv
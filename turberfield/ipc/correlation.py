@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import Counter
+from collections import OrderedDict
+import math
+
+__doc__ = """
+A node can send a message and await its reply, eg::
+
+    msg = parcel(token, Alert(ts, "ping"), dst=dst)
+    try:
+        rv = await node.request(msg, timeout=2)
+    except asyncio.TimeoutError:
+        ...
+
+The peer answers with :py:func:`reply <turberfield.ipc.message.reply>`, which
+keeps the id of the original message. A reply which resolves a request does
+not go to the `up` queue or the handlers of the node.
+
+"""
+
+
+class Evicted(Exception):
+    """
+    The request was dropped to make room for newer ones, before its
+    reply came.
+
+    """
+
+
+class TimerWheel:
+    """
+    Schedules many timeouts with a single event loop timer.
+
+    Timeouts fall into slots of `tick` seconds. The wheel runs only while
+    it has timeouts to serve.
+
+    :param loop: An asyncio event loop.
+    :param tick: The resolution of the wheel in seconds.
+    :param slots: The number of slots in the wheel.
+
+    """
+
+    def __init__(self, loop, tick=0.05, slots=256):
+        self.loop = loop
+        self.tick = tick
+        self.slots = [{} for i in range(slots)]
+        self.now = 0
+        self.count = 0
+        self.handle = None
+
+    def schedule(self, key, delay, callback):
+        """
+        Arranges for `callback(key)` to be called after `delay` seconds.
+        Returns a handle for :py:meth:`cancel`.
+
+        """
+        due = self.now + max(1, math.ceil(delay / self.tick))
+        slot = due % len(self.slots)
+        self.slots[slot][key] = (due, callback)
+        self.count += 1
+        if self.handle is None:
+            self.handle = self.loop.call_later(self.tick, self.advance)
+        return slot
+
+    def cancel(self, key, slot):
+        if self.slots[slot].pop(key, None) is not None:
+            self.count -= 1
+
+    def advance(self):
+        self.now += 1
+        slot = self.slots[self.now % len(self.slots)]
+        due = [k for k, (t, callback) in slot.items() if t <= self.now]
+        for key in due:
+            t, callback = slot.pop(key)
+            self.count -= 1
+            callback(key)
+
+        if self.count:
+            self.handle = self.loop.call_later(self.tick, self.advance)
+        else:
+            self.handle = None
+
+
+class Correlator:
+    """
+    Matches replies to the messages which asked for them.
+
+    :param loop: An asyncio event loop.
+    :param maxsize: The greatest number of requests awaiting a reply.
+        Beyond this, the oldest is cancelled.
+    :param timeout: The default time in seconds to wait for a reply.
+    :param wheel: An optional :py:class:`TimerWheel` to share.
+
+    The attribute `stats` counts requests expired and evicted.
+
+    """
+
+    def __init__(self, loop, maxsize=1024, timeout=5.0, wheel=None):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.wheel = wheel or TimerWheel(loop)
+        self.pending = OrderedDict()
+        self.stats = Counter()
+
+    def expect(self, msg, timeout=None):
+        """
+        Registers a message as a request. Returns a future which resolves to
+        its reply, or raises `asyncio.TimeoutError`. If the request is evicted
+        by newer ones, the future raises :py:class:`Evicted`. If its id is
+        registered again, the future is cancelled.
+
+        """
+        key = msg.header.id
+        self.discard(key)
+        while len(self.pending) >= self.maxsize:
+            self.stats["evicted"] += 1
+            oldest = next(iter(self.pending))
+            self.discard(oldest, Evicted(oldest))
+
+        future = self.loop.create_future()
+        slot = self.wheel.schedule(
+            key, self.timeout if timeout is None else timeout, self.expire
+        )
+        self.pending[key] = (future, msg, slot)
+        return future
+
+    def discard(self, key, exc=None):
+        """
+        Forgets a request. Its future is cancelled, or given the
+        exception `exc`.
+
+        """
+        try:
+            future, request, slot = self.pending.pop(key)
+        except KeyError:
+            return
+        self.wheel.cancel(key, slot)
+        if exc is None:
+            future.cancel()
+        elif not future.done():
+            future.set_exception(exc)
+
+    def expire(self, key):
+        future, request, slot = self.pending.pop(key, (None, None, None))
+        if future is not None and not future.done():
+            self.stats["expired"] += 1
+            future.set_exception(asyncio.TimeoutError())
+
+    def resolve(self, msg):
+        """
+        Returns `True` if the message is the reply to a request.
+
+        A request sent to this node, or to a group it belongs to, comes
+        back here with the same id. It is recognised by its source and
+        destination, which a reply has swapped. When those are the same,
+        only the request's own copies share its payload.
+
+        """
+        hdr = msg.header
+        try:
+            future, request, slot = self.pending[hdr.id]
+        except KeyError:
+            return False
+
+        req = request.header
+        if (hdr.src, hdr.dst) == (req.src, req.dst) and (
+            req.src != req.dst or msg.payload is request.payload
+        ):
+            # The request itself, on its way out or looped back.
+            return False
+
+        if req.dst.application != "*" and hdr.src != req.dst:
+            return False
+
+        del self.pending[hdr.id]
+        self.wheel.cancel(hdr.id, slot)
+        if not future.done():
+            future.set_result(msg)
+        return True
@@ -16,40 +16,75 @@
 # You should have received a copy of the GNU General Public License
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import namedtuple
+
 from turberfield.ipc.flow import Flow
+from turberfield.ipc.message import Header
 from turberfield.ipc.message import Message
-from turberfield.ipc.types import Address
+from turberfield.ipc.types import address_of
 
+Hosted = namedtuple("Hosted", ["token", "up", "dispatcher"])
 
 class PeerRouter:
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.routes = {}
 
-    def hop(self, token, msg, policy):
-        here = Address(
-            token.namespace, token.user, token.service, token.application)
+    def route(self, token, application, policy):
+        """
+        Returns the POA of an application, or `None` if there is no route.
+
+        Routes are cached. An entry is used for as long as the DIF reports
+        no change to the flows of the application, so that processes which
+        share a DIF see the same routes.
+
+        """
+        key = (tuple(token[:4]), application, policy)
+        try:
+            ref, stamp, poa = self.routes[key]
+        except KeyError:
+            pass
+        else:
+            if stamp is not None and Flow.stamp(ref) == stamp:
+                return poa
+
+        ref = next(Flow.find(token, application=application, policy=policy), None)
+        if ref is None:
+            self.routes.pop(key, None)
+            return None
 
-        if msg.header.hop >= msg.header.hMax:
+        stamp = Flow.stamp(ref)
+        poa = Flow.inspect(ref)
+        self.routes[key] = (ref, stamp, poa)
+        return poa
+
+    def hop(self, token, msg, policy):
+        here = address_of(token)
+        hdr = msg.header
+        if hdr.hop >= hdr.hMax:
             return (None, None)
 
         msg = Message(
-            msg.header._replace(
-                hop=msg.header.hop + 1,
-                via=here
-            ),
+            Header(hdr.id, hdr.src, hdr.dst, hdr.hMax, here, hdr.hop + 1),
             msg.payload
         )
 
-        if msg.header.dst == here:
+        if hdr.dst is here or hdr.dst == here:
             return (None, msg)
-            
-        hop = next(Flow.find(
-            token,
-            application=msg.header.dst.application,
-            policy=policy),
-        None)
-        if hop is None:
+
+        if hdr.dst.application == "*":
+            if hdr.hop:
+                # Arrived from the group of the service.
+                return (None, msg)
+            if hdr.dst[:3] != here[:3]:
+                token = token._replace(
+                    namespace=hdr.dst.namespace, user=hdr.dst.user, service=hdr.dst.service
+                )
+            return (self.route(token, "*", "multicast"), msg)
+
+        poa = self.route(token, msg.header.dst.application, policy)
+        if poa is None:
             # TODO: Get next hop from routing table
             # mechanism
             #search = ((i, Flow.inspect(i)) for i in Flow.find(token, policy="application"))
@@ -61,5 +96,44 @@ class PeerRouter:
             #)
             return (None, msg)
 
-        poa = Flow.inspect(hop)
         return (poa, msg)
+
+class Hosting:
+    """
+    Lets one node serve many applications from a single endpoint.
+
+    Messages are demultiplexed on the application of their destination
+    address to the `up` queue of each hosted application.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hosted = {}
+
+    def hop(self, token, msg, policy):
+        hosted = self.hosted.get(msg.header.dst.application)
+        if hosted is not None:
+            token = hosted.token
+        return super().hop(token, msg, policy)
+
+    def deliver(self, msg):
+        if msg.header.dst.application == "*":
+            super().deliver(msg)
+            hosts = self.hosted.values()
+        else:
+            hosted = self.hosted.get(msg.header.dst.application)
+            if hosted is None:
+                return super().deliver(msg)
+            hosts = [hosted]
+
+        for hosted in hosts:
+            if hosted.dispatcher is None or not hosted.dispatcher(msg):
+                hosted.up.put_nowait(msg)
+
+    def local(self, address):
+        hosted = self.hosted.get(address.application)
+        if hosted is None:
+            return super().local(address)
+        here = address_of(hosted.token)
+        return address is here or address == here
@@ -18,7 +18,14 @@
 
 import argparse
 import asyncio
+import base64
+import binascii
+from collections import Counter
+from collections import OrderedDict
 import datetime
+import hashlib
+import hmac
+import json
 import logging
 import os.path
 try:
@@ -31,6 +38,7 @@ try:
 except ImportError:
     secrets = None
 import sys
+import time
 import uuid
 
 import aiohttp.web
@@ -44,6 +52,7 @@ from turberfield.ipc.cli import add_common_options
 from turberfield.ipc.cli import add_proactor_options
 import turberfield.ipc.demo.processor
 from turberfield.ipc.proactor import Initiator
+from turberfield.ipc.proactor import Zygote
 from turberfield.utils.misc import config_parser
 from turberfield.utils.misc import log_setup
 
@@ -55,8 +64,96 @@ __doc__ = """
 
 """
 
+class TokenCache:
+    """
+    Verifies HS256 tokens, and remembers those which pass.
+
+    The HMAC state for `key` is prepared once and copied for each
+    verification. A cached token is good until its `exp` claim.
+
+    :param key: The shared secret which signs the tokens.
+    :param maxsize: The greatest number of tokens to remember.
+        Beyond this, the least recently used is forgotten.
+    :param clock: A function which returns the time in seconds since
+        the epoch.
+
+    The attribute `stats` counts cache hits, misses and rejections.
+
+    """
+
+    @staticmethod
+    def b64decode(text):
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+    def __init__(self, key, maxsize=1024, clock=time.time):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        self.mac = hmac.new(key, digestmod=hashlib.sha256)
+        self.maxsize = maxsize
+        self.clock = clock
+        self.verified = OrderedDict()
+        self.stats = Counter()
+
+    def verify(self, text, now=None):
+        """
+        Returns the payload of a token if its signature is good and it has
+        not expired, otherwise `None`. Does not consult the cache.
+
+        """
+        now = self.clock() if now is None else now
+        try:
+            signed, _, signature = text.rpartition(".")
+            header, _, payload = signed.partition(".")
+            if json.loads(self.b64decode(header).decode("utf-8")).get("alg") != "HS256":
+                return None
+
+            mac = self.mac.copy()
+            mac.update(signed.encode("ascii"))
+            if not hmac.compare_digest(mac.digest(), self.b64decode(signature)):
+                return None
+
+            payload = json.loads(self.b64decode(payload).decode("utf-8"))
+            if now >= payload.get("exp", now + 1) or now < payload.get("nbf", now):
+                return None
+        except (AttributeError, TypeError, ValueError, binascii.Error):
+            return None
+        else:
+            return payload
+
+    def check(self, text, now=None):
+        """
+        Returns the payload of a valid token, otherwise `None`.
+
+        """
+        if isinstance(text, bytes):
+            text = text.decode("ascii", "replace")
+        now = self.clock() if now is None else now
+        try:
+            payload = self.verified[text]
+        except KeyError:
+            pass
+        else:
+            if now < payload.get("exp", now + 1):
+                self.stats["hit"] += 1
+                self.verified.move_to_end(text)
+                return payload
+            del self.verified[text]
+
+        self.stats["miss"] += 1
+        payload = self.verify(text, now)
+        if payload is None:
+            self.stats["rejected"] += 1
+            return None
+
+        self.verified[text] = payload
+        while len(self.verified) > self.maxsize:
+            self.verified.popitem(last=False)
+        return payload
+
 class Authenticator(Initiator):
 
+    TOKEN_CACHE_MAX = 1024
+
     @staticmethod
     def create_token(key, session=None):
          now = datetime.datetime.utcnow()
@@ -86,36 +183,60 @@ class Authenticator(Initiator):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.secret = secrets.token_hex() if secrets else uuid.uuid4().hex
+        self.tokens = TokenCache(self.secret, maxsize=self.TOKEN_CACHE_MAX)
 
-    async def launch(self, module, guid=None):
-        guid = guid or uuid.uuid4().hex
-        self.jobs[guid] = self.worker(
-            module, guid, token=self.create_token(self.secret).decode("utf-8")
-        )
-        await self.queue.put(guid)
-        return guid
+    def verify_token(self, text):
+        """
+        Returns the payload of a token signed by this Authenticator,
+        or `None` if it is not valid.
+
+        """
+        return self.tokens.check(text)
+
+    async def launch(self, module, guid=None, **kwargs):
+        kwargs["token"] = self.create_token(self.secret).decode("utf-8")
+        return await super().launch(module, guid, **kwargs)
 
 class Service(turberfield.ipc.demo.processor.Service):
 
+    CONFIG_WAIT_MAX = 60
+    JOB_PAGE_SIZE = 100
+    JOB_PAGE_MAX = 1000
+
     def setup_routes(self, app):
         super().setup_routes(app)
         app.router.add_get("/config/{guid}", self.config)
         app.router.add_post("/create", self.create)
         app.router.add_get("/job", self.job)
+        app.router.add_get("/metrics", self.metrics)
 
     async def config(self, request):
         try:
             bits = request.headers.get("AUTHORIZATION").split()
             token = bits[0] == "Bearer" and bits[1]
-            payload = self.proactor.check_token(token, self.proactor.secret)
+            payload = self.proactor.verify_token(token)
             session = payload["session"]
         except:
             return aiohttp.web.HTTPForbidden()
 
         self.log.debug(payload)
         guid = request.match_info.get("guid")
-        rv = dict(self.proactor.cfg.items(guid))
-        return aiohttp.web.json_response(rv)
+        try:
+            wait = min(float(request.query.get("wait", 0)), self.CONFIG_WAIT_MAX)
+            version, delta = await self.proactor.config_changes(
+                guid, request.headers.get("If-None-Match", "").strip('"') or None,
+                timeout=wait
+            )
+        except KeyError:
+            return aiohttp.web.HTTPNotFound()
+        except ValueError:
+            return aiohttp.web.HTTPBadRequest()
+
+        etag = '"{0}"'.format(version)
+        if delta is None:
+            return aiohttp.web.Response(status=304, headers={"ETag": etag})
+        else:
+            return aiohttp.web.json_response(delta, headers={"ETag": etag})
 
     async def create(self, request):
         data = await request.post()
@@ -134,9 +255,37 @@ class Service(turberfield.ipc.demo.processor.Service):
         return rv
 
     async def job(self, request):
-        job = request.match_info.get("job")
-        rv = self.proactor.jobs.get(job, self.proactor.jobs)
-        return aiohttp.web.json_response(str(rv))
+        jobs = self.proactor.jobs
+        try:
+            state = request.query.get("state") or None
+            offset = max(0, int(request.query.get("offset", 0)))
+            limit = int(request.query.get("limit", self.JOB_PAGE_SIZE))
+            limit = max(0, min(limit, self.JOB_PAGE_MAX))
+            page = jobs.page(state, offset, limit)
+        except (KeyError, ValueError):
+            return aiohttp.web.HTTPBadRequest()
+
+        counts = jobs.counts()
+        total = len(jobs) if state is None else counts[state]
+        rv = OrderedDict([
+            ("total", total),
+            ("counts", counts),
+            ("offset", offset),
+            ("limit", limit),
+            ("next", offset + limit if offset + limit < total else None),
+            ("jobs", [jobs.summary(i) for i in page]),
+            ("modules", OrderedDict([
+                (name, supervisor._asdict())
+                for name, supervisor in self.proactor.supervisors.items()
+            ])),
+        ])
+        return aiohttp.web.json_response(rv)
+
+    async def metrics(self, request):
+        rv = {
+            "startup": {k: v._asdict() for k, v in self.proactor.metrics.items()}
+        }
+        return aiohttp.web.json_response(rv)
 
 
 class LogPath(PathLike):
@@ -159,6 +308,14 @@ def main(args):
     )
     home.mkdir(parents=True, exist_ok=True)
     initiator = Authenticator(args, loop=loop, home=str(home))
+    if args.zygote:
+        initiator.zygote = Zygote(
+            loop,
+            preload=[
+                "aiohttp.web", "jwt", "turberfield.utils.misc",
+                "turberfield.ipc.demo.processor"
+            ]
+        )
 
     log.info("Read config...")
     try:
@@ -168,6 +325,11 @@ def main(args):
         loop.stop()
         loop.close()
         os._exit(1)
+    except ValueError as e:
+        log.error(e)
+        loop.stop()
+        loop.close()
+        os._exit(1)
     else:
         addr, port = initiator.register_connection(args.guid, args.port)
 
@@ -179,6 +341,7 @@ def main(args):
         f = loop.create_server(handler, addr, port)
         srv = loop.run_until_complete(f)
         log.info("Serving on {0}:{1}".format(*srv.sockets[0].getsockname()))
+        initiator.ready(*srv.sockets[0].getsockname()[:2])
         try:
             loop.run_forever()
         except KeyboardInterrupt:
@@ -206,6 +369,10 @@ def run():
             )
         )
     )
+    p.add_argument(
+        "--zygote", action="store_true", default=False,
+        help="Fork jobs from a process which has already imported their modules."
+    )
     args = p.parse_args()
     if args.version:
         sys.stderr.write(__version__ + "\n")
@@ -53,22 +53,45 @@ class Service:
         del rv["token"]
         return aiohttp.web.json_response(rv)
 
-    async def config_refresher(self, wait=300):
+    def update_config(self, delta):
+        guid = self.proactor.args.guid
+        for key, val in delta.items():
+            if val is None:
+                self.proactor.cfg.remove_option(guid, key)
+            else:
+                self.proactor.cfg.set(guid, key, val.replace("$", "$$"))
+        if delta:
+            self.log.info("Config changed: {0}".format(", ".join(sorted(delta))))
+
+    async def config_refresher(self, wait=30):
+        """Wait on the parent for changes to this job's configuration.
+        Each request is held by the parent for up to `wait` seconds.
+
+        """
         section = self.proactor.cfg[self.proactor.args.guid]
+        version = None
         async with aiohttp.ClientSession() as session:
             while "parent_addr" in section:
                 url = "http://{0}:{1}/config/{2}".format(
                     section["parent_addr"], section["parent_port"], self.proactor.args.guid
                 )
-                async with session.get(
-                    url,
-                    headers={"authorization": "Bearer {0}".format(section["token"])}
-                ) as resp:
-                    if resp.status == 200:
-                        section = json.loads(await resp.text())
-                        print(section)
-                    else:
-                        self.log.warning(url)
+                headers = {"authorization": "Bearer {0}".format(section["token"])}
+                if version is not None:
+                    headers["if-none-match"] = version
+                try:
+                    async with session.get(
+                        url, headers=headers, params={"wait": str(wait)}
+                    ) as resp:
+                        if resp.status == 200:
+                            version = resp.headers.get("ETag")
+                            self.update_config(json.loads(await resp.text()))
+                            continue
+                        elif resp.status == 304:
+                            continue
+                        else:
+                            self.log.warning("{0} {1}".format(resp.status, url))
+                except aiohttp.ClientError as e:
+                    self.log.warning("{0} {1!r}".format(url, e))
                 await asyncio.sleep(wait)
 
 
@@ -88,6 +111,11 @@ def main(args):
         loop.stop()
         loop.close()
         os._exit(1)
+    except ValueError as e:
+        log.error(e)
+        loop.stop()
+        loop.close()
+        os._exit(1)
     else:
         addr, port = processor.register_connection(args.guid, args.port)
 
@@ -104,6 +132,7 @@ def main(args):
             return 1
         else:
             log.info("Serving on {0}:{1}".format(*srv.sockets[0].getsockname()))
+            processor.ready(*srv.sockets[0].getsockname()[:2])
         try:
             loop.run_forever()
         except KeyboardInterrupt:
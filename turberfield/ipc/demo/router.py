@@ -24,6 +24,7 @@ import sys
 
 from turberfield.ipc import __version__
 from turberfield.ipc.cli import add_common_options
+from turberfield.ipc.bounded import BoundedQueue
 from turberfield.ipc.cli import add_ipc_options
 from turberfield.ipc.fsdb import token
 from turberfield.ipc.node import create_udp_node
@@ -59,21 +60,34 @@ def main(args):
     asyncio.set_event_loop(loop)
 
     down = asyncio.Queue(loop=loop)
-    up = asyncio.Queue(loop=loop)
+    # The router does not consume its own messages; keep them bounded.
+    up = BoundedQueue(loop=loop)
 
-    tok = token(args.connect, APP_NAME)
-    node = create_udp_node(loop, tok, down, up)
+    tok = token(args.connect, "demo", APP_NAME)
+    reuse_port = args.reuse_port or args.workers > 1
+    node = create_udp_node(loop, tok, down, up, reuse_port=reuse_port)
     loop.create_task(node(token=tok))
 
-    log.info("Starting router node...")
+    # The kernel spreads datagrams across all sockets bound to the POA.
+    workers = [
+        loop.run_until_complete(asyncio.create_subprocess_exec(
+            sys.executable, "-m", APP_NAME,
+            "--connect", args.connect, "--reuse-port",
+            loop=loop
+        ))
+        for i in range(args.workers - 1)
+    ]
+
+    log.info("Starting router node with {0} worker(s)...".format(args.workers))
     try:
         loop.run_forever()
     except KeyboardInterrupt:
         for task in asyncio.Task.all_tasks(loop=loop):
             task.cancel()
 
-        for resource in resources:
-            resource.close()
+        for proc in workers:
+            proc.terminate()
+            loop.run_until_complete(proc.wait())
 
     finally:
         loop.close()
@@ -85,6 +99,12 @@ def run():
     )
     p = add_common_options(p)
     p = add_ipc_options(p)
+    p.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of processes to serve the router POA [1]")
+    p.add_argument(
+        "--reuse-port", action="store_true", default=False,
+        help="Bind the router POA with SO_REUSEPORT")
     args = p.parse_args()
     if args.version:
         sys.stderr.write(__version__ + "\n")
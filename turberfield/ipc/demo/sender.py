@@ -74,7 +74,7 @@ def main(args):
     down = asyncio.Queue(loop=loop)
     up = asyncio.Queue(loop=loop)
 
-    tok = token(args.connect, APP_NAME)
+    tok = token(args.connect, "demo", APP_NAME)
     node = create_udp_node(loop, tok, down, up)
     loop.create_task(node(token=tok))
     loop.create_task(queue_logger(loop, up))
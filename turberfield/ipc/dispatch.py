@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import singledispatch
+import warnings
+
+__doc__ = """
+A node can pass the messages it receives to handler functions, rather than
+to its `up` queue. Handlers are registered by payload type, eg::
+
+    def on_alert(obj, msg):
+        print(msg.header.src, obj.text)
+
+    node = create_udp_node(loop, token, handlers={Alert: on_alert})
+
+A handler is called synchronously from the receive path with each payload
+object of its type, and the message which carried it.
+
+"""
+
+
+class Dispatcher:
+    """
+    Calls handlers for the objects in a message payload.
+
+    A message is consumed if every object in its payload has a handler.
+    Otherwise, it goes to the batch handler if there is one.
+    The batch handler is called once per event loop iteration with a list
+    of the messages collected.
+
+    :param loop: An asyncio event loop.
+    :param handlers: A dictionary of handler functions mapped by type.
+    :param batch: An optional function which accepts a list of messages.
+
+    """
+
+    def __init__(self, loop, handlers=None, batch=None):
+        self.loop = loop
+        self.handle = singledispatch(Dispatcher.unhandled)
+        self.batch = batch
+        self.pending = []
+        for typ, handler in (handlers or {}).items():
+            self.register(typ, handler)
+
+    @staticmethod
+    def unhandled(obj, msg):
+        return False
+
+    def register(self, typ, handler):
+        """
+        Registers a function to handle objects of a given type.
+
+        """
+        self.handle.register(typ, handler)
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        try:
+            self.batch(batch)
+        except Exception as e:
+            warnings.warn(repr(getattr(e, "args", e) or e))
+
+    def __call__(self, msg):
+        """
+        Dispatches a message. Returns `True` if the message was consumed.
+
+        """
+        handled = bool(msg.payload)
+        for obj in msg.payload:
+            try:
+                handled = self.handle(obj, msg) is not False and handled
+            except Exception as e:
+                warnings.warn(repr(getattr(e, "args", e) or e))
+
+        if handled:
+            return True
+        elif self.batch is not None:
+            if not self.pending:
+                self.loop.call_soon(self.flush)
+            self.pending.append(msg)
+            return True
+        else:
+            return False
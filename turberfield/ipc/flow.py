@@ -46,6 +46,12 @@ class Flow:
         warnings.warn("No inspect function registered for {}".format(type(obj)))
         return None
 
+    @staticmethod
+    @singledispatch
+    def stamp(obj, *args, **kwargs):
+        warnings.warn("No stamp function registered for {}".format(type(obj)))
+        return None
+
     @staticmethod
     @singledispatch
     def replace(obj, data, *args, **kwargs):
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import Counter
+from collections import OrderedDict
+import struct
+import time
+import warnings
+
+
+__doc__ = """
+A datagram larger than the path MTU gets fragmented by the IP layer, and
+the loss of any one of those IP fragments loses the whole datagram.
+This module splits large packets into datagrams which each fit within the
+MTU, and reassembles them at the far end.
+
+Each fragment carries a short binary header: a marker byte, a 64-bit
+message id, the fragment index and the fragment count. Packets which
+already fit within the MTU are sent unchanged.
+
+"""
+
+MARKER = b"~"
+HEADER = struct.Struct("!cQHH")
+MTU = 1400
+MAX_BYTES = 4 * 2 ** 20
+
+
+def fragment(packet:bytes, id:int, mtu=MTU):
+    """
+    Split a packet into datagrams of no more than `mtu` bytes.
+
+    This function is a generator. A packet which fits within the MTU is
+    yielded as-is. Otherwise each fragment is prefixed by a header which
+    identifies its place in the message.
+
+    :param packet: A `bytes` object, eg: from
+        :py:func:`dumpb <turberfield.ipc.netstrings.dumpb>`.
+    :param id: An integer id, unique to the sender, for this packet.
+    :param mtu: The maximum size of a datagram in bytes.
+
+    Raises `ValueError` for a packet too big for a default
+    :py:class:`Reassembly <turberfield.ipc.fragment.Reassembly>` to accept.
+
+    """
+    if len(packet) <= mtu:
+        yield packet
+        return
+
+    size = mtu - HEADER.size
+    count = -(-len(packet) // size)
+    if count > 0xFFFF or count * (MTU - HEADER.size) > MAX_BYTES:
+        raise ValueError("Packet of {0} bytes needs too many fragments.".format(len(packet)))
+
+    view = memoryview(packet)
+    for index in range(count):
+        yield HEADER.pack(MARKER, id, index, count) + view[index * size:(index + 1) * size]
+
+
+class Reassembly:
+    """
+    Collects fragments and returns complete packets.
+
+    Memory is bounded; when either limit is exceeded the oldest partial
+    message is discarded. The first fragment of a message reserves space
+    for all of it, at the full payload of `mtu`. A message too big for
+    `max_bytes` on its own is dropped. Partial messages expire after
+    `timeout` seconds. Fragments of a message which was recently completed
+    are ignored.
+
+    :param timeout: The lifetime in seconds of a partial message.
+    :param mtu: The maximum size of a datagram in bytes.
+    :param max_bytes: The total size of partial messages retained.
+    :param max_messages: The number of partial messages retained.
+    :param history: The number of completed message ids remembered
+        for duplicate suppression.
+    :param clock: A function returning a monotonic time in seconds.
+
+    """
+
+    def __init__(
+        self, timeout=5.0, mtu=MTU, max_bytes=MAX_BYTES, max_messages=256,
+        history=1024, clock=time.monotonic
+    ):
+        self.timeout = timeout
+        self.mtu = mtu
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.history = history
+        self.clock = clock
+        self.partial = OrderedDict([])
+        self.complete = OrderedDict([])
+        self.size = 0
+        self.stats = Counter()
+
+    def discard(self, key):
+        deadline, parts, size, missing = self.partial.pop(key)
+        self.size -= size
+
+    def expire(self, now):
+        # Deadlines are in insertion order, so stop at the first live one.
+        while self.partial:
+            key, (deadline, *_) = next(iter(self.partial.items()))
+            if deadline > now:
+                break
+            self.discard(key)
+            self.stats["expired"] += 1
+
+    def receive(self, data, addr=None):
+        """
+        Accept a datagram. Returns a complete packet, or `None` if
+        the packet is not yet complete.
+
+        :param data: A datagram as received from the transport.
+        :param addr: The address of the sender.
+
+        """
+        if data[:1] != MARKER:
+            return data
+
+        if len(data) < HEADER.size:
+            warnings.warn("Fragment too short.")
+            return None
+
+        marker, id, index, count = HEADER.unpack_from(data)
+        key = (addr, id)
+        now = self.clock()
+        self.expire(now)
+
+        if index >= count:
+            warnings.warn("Fragment out of range.")
+            return None
+
+        if len(data) > self.mtu:
+            warnings.warn("Fragment too long.")
+            return None
+
+        if key in self.complete:
+            self.stats["duplicate"] += 1
+            return None
+
+        try:
+            deadline, parts, size, missing = self.partial[key]
+        except KeyError:
+            size = count * (self.mtu - HEADER.size)
+            if size > self.max_bytes:
+                self.stats["oversize"] += 1
+                return None
+            deadline, parts, missing = (now + self.timeout, [None] * count, count)
+            self.partial[key] = (deadline, parts, size, missing)
+            self.size += size
+        else:
+            if len(parts) != count:
+                warnings.warn("Fragment count mismatch.")
+                return None
+
+        if parts[index] is not None:
+            self.stats["duplicate"] += 1
+            return None
+
+        chunk = bytes(data[HEADER.size:])
+        parts[index] = chunk
+        self.partial[key] = (deadline, parts, size, missing - 1)
+
+        if missing == 1:
+            self.discard(key)
+            self.complete[key] = None
+            while len(self.complete) > self.history:
+                self.complete.popitem(last=False)
+            return b"".join(parts)
+
+        while self.partial and (
+            self.size > self.max_bytes or len(self.partial) > self.max_messages
+        ):
+            self.discard(next(iter(self.partial)))
+            self.stats["evicted"] += 1
+
+        return None
@@ -178,6 +178,21 @@ def inspect_by_resource(context:Resource):
         else:
             return obj
 
+@Flow.stamp.register(Resource)
+def stamp_by_resource(context:Resource):
+    """
+    Returns a value which changes when the flows of an application are
+    created or removed, or when the record itself is replaced.
+
+    """
+    try:
+        return (
+            os.stat(os.path.join(*context[:5])).st_mtime_ns,
+            os.stat(os.path.join(*context[:-1]) + context.suffix).st_mtime_ns
+        )
+    except OSError:
+        return None
+
 @Flow.replace.register(Resource)
 def replace_by_resource(path:Resource, obj):
     with open(os.path.join(*path[:-1]) + path.suffix, 'w') as record:
@@ -17,11 +17,15 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import base64
 from collections import namedtuple
 from datetime import datetime
 from functools import singledispatch
+import itertools
 import json
+import os
 import re
+import time
 import uuid
 import warnings
 
@@ -45,6 +49,7 @@ a message and loaded back::
 """
 
 Address = turberfield.ipc.types.Address
+address_of = turberfield.ipc.types.address_of
 Header = namedtuple("Header", ["id", "src", "dst", "hMax", "via", "hop"])
 Alert = namedtuple("Alert", ["ts", "text"])
 Scalar = namedtuple("Scalar", ["name", "unit", "value", "regex", "tip"])
@@ -63,7 +68,67 @@ application data.
 
 Assembly.register(Alert, Header, Message, Scalar)
 
-def parcel(token, *args, dst=None, via=None, hMax=3):
+def uuid_ids():
+    """
+    Generates message ids as uuid4 hex strings. These need no coordination,
+    but each costs a call to `os.urandom`, and 32 characters on the wire.
+
+    """
+    return (uuid.uuid4().hex for i in itertools.count())
+
+def counter_ids(prefix=None):
+    """
+    Generates message ids from a random prefix and a monotonic counter, eg:
+    `'ry3qqvnj.1f'`. The prefix is chosen once, so ids are cheap to make
+    and short on the wire.
+
+    :param prefix: An optional string to identify the node.
+
+    """
+    prefix = prefix or base64.b32encode(os.urandom(5)).decode("ascii").lower()
+    return map("{0}.{1:x}".format, itertools.repeat(prefix), itertools.count())
+
+def snowflake_ids(node=None, epoch=1451606400, clock=time.time):
+    """
+    Generates message ids as 64-bit integers. Each one packs a timestamp
+    in milliseconds since `epoch`, a 10-bit node number and a 12-bit
+    sequence. Ids sort in order of creation.
+
+    :param node: An optional integer to identify the node. If `None`,
+        a random value is chosen.
+    :param epoch: The start time of the timestamp, in seconds since 1970.
+
+    """
+    node = (os.getpid() ^ int.from_bytes(os.urandom(2), "big")) if node is None else node
+    node &= 0x3FF
+    last = seq = 0
+    while True:
+        now = int((clock() - epoch) * 1000)
+        if now > last:
+            last, seq = now, 0
+        else:
+            # Same millisecond, or the clock went back.
+            seq = (seq + 1) & 0xFFF
+            if not seq:
+                last += 1
+        yield (last << 22) | (node << 12) | seq
+
+message_ids = counter_ids()
+
+def reseed_ids():
+    """
+    Gives this process a fresh module-wide generator of message ids.
+    A forked process would otherwise repeat the ids of its parent.
+    This is done automatically after `os.fork` on Python 3.7 and later.
+
+    """
+    global message_ids
+    message_ids = counter_ids()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reseed_ids)
+
+def parcel(token, *args, dst=None, via=None, hMax=3, ids=None):
     """
     :param token: A DIF token. Just now the function
                   `turberfield.ipc.fsdb.token`_ is the source of these.
@@ -73,20 +138,77 @@ def parcel(token, *args, dst=None, via=None, hMax=3):
     :param via: An :py:class:`Address <turberfield.ipc.types.Address>` to
                 pass the message on to. If `None`, the most direct route is selected.
     :param hMax: The maximum number of node hops permitted for this message.
+    :param ids: An optional iterator of message ids, eg: from
+                :py:func:`snowflake_ids <turberfield.ipc.message.snowflake_ids>`.
+                If `None`, ids come from a module-wide
+                :py:func:`counter_ids <turberfield.ipc.message.counter_ids>`.
     :rtype: Message
 
 
     """
+    src = address_of(token)
     hdr = Header(
-        id=uuid.uuid4().hex,
-        src=Address(**{i: getattr(token, i, None) for i in Address._fields}),
-        dst=dst or Address(**{i: getattr(token, i, None) for i in Address._fields}),
+        id=next(ids or message_ids),
+        src=src,
+        dst=dst or src,
         hMax=hMax,
         via=via,
         hop=0,
     )
     return Message(hdr, args)
 
+def parcel_many(token, payloads, dsts, via=None, hMax=3, ids=None):
+    """
+    Makes one message for each destination, all of which share the
+    same payload. Use :py:func:`dumps <turberfield.ipc.message.dumps>`
+    to encode them so that the payload is encoded only once.
+
+    :param token: A DIF token.
+    :param payloads: A sequence of application objects to send in each message.
+    :param dsts: A sequence of :py:class:`Address <turberfield.ipc.types.Address>`
+                 objects for the destinations.
+    :param via: An optional :py:class:`Address <turberfield.ipc.types.Address>` to
+                pass the messages on to.
+    :param hMax: The maximum number of node hops permitted for each message.
+    :param ids: An optional iterator of message ids.
+    :rtype: A list of Message objects.
+
+    """
+    src = address_of(token)
+    ids = ids or message_ids
+    payload = tuple(payloads)
+    return [
+        Message(Header(next(ids), src, dst, hMax, via, 0), payload)
+        for dst in dsts
+    ]
+
+def dumps(msg, cache=None):
+    """
+    Encodes a message as JSON text which
+    :py:meth:`Assembly.loads <turberfield.utils.assembly.Assembly.loads>` will read.
+
+    :param msg: A Message object.
+    :param cache: An optional dictionary. Payloads are encoded once and
+                  kept here, so that messages which share a payload object
+                  need only have their headers encoded.
+    :rtype: str
+
+    """
+    if cache is None:
+        return Assembly.dumps(msg)
+
+    try:
+        payload = cache[id(msg.payload)][1]
+    except KeyError:
+        payload = Assembly.dumps(msg.payload)
+        # Keep the payload alive so that its id stays unique.
+        cache[id(msg.payload)] = (msg.payload, payload)
+
+    return '{{"_type": "{0}", "header": {1}, "payload": {2}}}'.format(
+        Message.__module__ + "." + Message.__name__,
+        Assembly.dumps(msg.header), payload
+    )
+
 def reply(header, *args, dst=None, via=None, hMax=3):
     """
     :param header: The Header object of the original message.
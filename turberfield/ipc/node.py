@@ -16,30 +16,138 @@
 # You should have received a copy of the GNU General Public License
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 from collections import namedtuple
+from collections import OrderedDict
+import functools
 import logging
+import socket
+import threading
 import warnings
 
+from turberfield.ipc.bounded import BoundedQueue
+from turberfield.ipc.bounded import Overflow
+from turberfield.ipc.delivery import Hosted
+from turberfield.ipc.delivery import Hosting
+from turberfield.ipc.dispatch import Dispatcher
 from turberfield.ipc.flow import Flow
 from turberfield.utils.assembly import Assembly
 
 __doc__ = """
 
-.. py:function:: create_udp_node(loop, token, down, up, types)
+.. py:function:: create_udp_node(loop, token, down=None, up=None, rate=None, burst=None, sndbuf=None, rcvbuf=None, maxsize=1024, overflow=Overflow.drop_oldest, down_overflow=Overflow.block, handlers=None, batch=None, reuse_port=None, executor=None, multicast=False)
    
    :param loop: An asyncio_ event loop.
    :param token: A DIF token.
    :param down: An asyncio_ queue which takes messages down to the network POA.
+        If `None`, a :py:class:`BoundedQueue <turberfield.ipc.bounded.BoundedQueue>`
+        is created.
    :param up: An asyncio_ queue which bring up messages from the network POA.
-   :param types: An optional dictionary of types mapped by their fully qualified names.
+        If `None`, a :py:class:`BoundedQueue <turberfield.ipc.bounded.BoundedQueue>`
+        is created.
+   :param rate: An optional rate in bytes per second at which to pace
+        messages to each peer. Messages which must wait are held in a backlog
+        of up to `BACKLOG` for each peer. Beyond that, they are dropped and
+        counted in the `stats` of the node.
+   :param burst: The number of bytes which may be sent to a peer without pacing.
+   :param sndbuf: An optional size in bytes for the socket send buffer.
+   :param rcvbuf: An optional size in bytes for the socket receive buffer.
+   :param maxsize: The capacity of queues created by the node.
+   :param overflow: The :py:class:`Overflow <turberfield.ipc.bounded.Overflow>`
+        policy for the `up` queue if created by the node.
+   :param down_overflow: The :py:class:`Overflow <turberfield.ipc.bounded.Overflow>`
+        policy for the `down` queue if created by the node. By default,
+        `put_nowait` raises `asyncio.QueueFull` rather than lose a message.
+   :param handlers: An optional dictionary of handler functions mapped by
+        payload type. See :py:mod:`dispatch <turberfield.ipc.dispatch>`.
+   :param batch: An optional function which accepts lists of the messages
+        not consumed by `handlers`.
+   :param reuse_port: If `True`, binds with `SO_REUSEPORT` so that several
+        processes may serve the same POA.
+   :param executor: An optional `concurrent.futures` executor in which to
+        decode large messages. A process pool must be able to import the
+        types registered with `Assembly`.
+   :param multicast: If `True`, the node joins the multicast group of its
+        service. Messages with a destination address whose application
+        is `'*'` are sent once to that group.
    :rtype: An asyncio_ Protocol instance.
 
+.. py:function:: start_node(token, down=None, up=None, transport="udp", *, loop=None, **kwargs)
+
+   This is a *coroutine*. It accepts the same keyword arguments as
+   `create_udp_node`, and may be called from within a running event loop.
+   The filesystem work of finding or creating flows is done in an executor,
+   so many nodes may be started concurrently, eg::
+
+       nodes = await asyncio.gather(*(start_node(i) for i in tokens))
+
+   :param token: A DIF token.
+   :param transport: The name of the transport. Only 'udp' is available.
+   :param loop: An asyncio_ event loop. If `None`, the current event loop.
+   :rtype: An asyncio_ Protocol instance.
+
+.. py:function:: start_host(token, down=None, up=None, transport="udp", *, loop=None, **kwargs)
+
+   This is a *coroutine*. It creates a node as `start_node` does. That node
+   may then host further applications, sharing its socket, its event loop
+   task and its `down` queue.
+
+.. py:function:: host(node, token, up=None, *, loop=None, maxsize=1024, overflow=Overflow.drop_oldest, handlers=None, batch=None)
+
+   This is a *coroutine*. It adds the application of `token` to a node created by
+   `start_host`, and advertises that node's POA in the application's flows.
+   Messages for the application are served to its own `up` queue, or its
+   handlers. Returns the `up` queue.
+
+   To send, an application puts messages parcelled with its own token on
+   the `down` queue of the node.
+
+   All the hosted queues share the socket of the node. Under the `pause`
+   policy, reading stops when any of them is full, and resumes only when
+   none of them is.
+
+The protocol instance keeps its queues as attributes `down` and `up`.
+
+Messages are put into the `up` queue directly from the event loop thread.
+A consumer on another thread should supply either a thread-safe queue
+(eg: `queue.Queue`) or a :py:class:`Handoff <turberfield.ipc.node.Handoff>`.
+
+Bounded queues protect a process from a slow consumer. With the `pause`
+overflow policy, the node stops reading from its socket until the
+application catches up, and further datagrams are queued (or dropped) by
+the kernel instead. Before Python 3.11, datagram transports cannot pause
+reading, so `pause` falls back to `drop_newest` with a warning.
+
+The `down` queue never drops a message by default. When it is full, a
+coroutine which calls `put` waits for room, and `put_nowait` raises
+`asyncio.QueueFull`.
+
 .. _asyncio: https://docs.python.org/3/library/asyncio.html#module-asyncio
 
 """
 
 Policy = namedtuple("Policy", ["routing", "poa", "role"])
 
+# Serialises allocation of pooled resources by concurrent nodes.
+flow_lock = threading.Lock()
+
+class Handoff:
+    """
+    Passes items to an asyncio queue whose event loop runs on another
+    thread. Use this object as the `up` queue of a node.
+
+    :param queue: An asyncio_ queue.
+    :param loop: The event loop which serves the queue.
+
+    """
+
+    def __init__(self, queue, loop):
+        self.queue = queue
+        self.loop = loop
+
+    def put_nowait(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
 class TakesPolicy:
 
     def __init__(self, *args, **kwargs):
@@ -48,44 +156,164 @@ class TakesPolicy:
 
 
 def match_policy(token, policy:Policy):
+    """
+    Returns references to the most recent flow of this application which
+    has all the given policies, or `None` if there is no such flow.
+
+    """
     # MRO important here.
     policies = [i for p in policy for i in p]
-    flows = Flow.find(token)
-    for flow in flows:
-        matched = []
-        for p in policies:
-            matched.append(next(Flow.find(token, application=token.application, policy=p), None))
-        if all(matched):
-            return matched
+    flows = OrderedDict([])
+    for ref in Flow.find(token, application=token.application):
+        flows.setdefault(ref.flow, {})[ref.policy] = ref
+
+    for refs in flows.values():
+        if all(p in refs for p in policies):
+            return [refs[p] for p in policies]
     return None
 
-def create_udp_node(loop, token, down, up):
+@functools.lru_cache(maxsize=None)
+def node_class(mechanisms:tuple):
     """
-    Creates a node which uses UDP for inter-application messaging
+    Composes a node class from a tuple of mechanisms. Classes are cached, so
+    nodes with the same mechanisms share a type.
+
+    """
+    return type("UdpNode", mechanisms, {})
+
+def node_services(token, policies:Policy):
+    """
+    Finds or creates the flows for a node's policies. Replaces each
+    policy name with its object, and returns the mechanisms to compose.
+
+    This function works on the filesystem, and blocks.
 
     """
-    assert loop.__class__.__name__.endswith("SelectorEventLoop")
- 
     services = []
-    types = Assembly.register(Policy)
-    policies = Policy(poa=["udp"], role=[], routing=["application"])
-    refs = match_policy(token, policies) or Flow.create(token, **policies._asdict())
+    with flow_lock:
+        refs = list(match_policy(token, policies) or Flow.create(token, **policies._asdict()))
     for ref in refs:
         obj = Flow.inspect(ref)
         key = next(k for k, v in policies._asdict().items() if ref.policy in v) 
         field = getattr(policies, key)
         field[field.index(ref.policy)] = obj
         try:
-            services.append(obj.mechanism)
+            if obj.mechanism is not None:
+                services.append(obj.mechanism)
         except AttributeError:
             warnings.warn("Policy '{}' lacks a mechanism".format(ref.policy))
+    return services
+
+async def start_node(
+    token, down=None, up=None, transport="udp", *, loop=None,
+    rate=None, burst=None, sndbuf=None, rcvbuf=None,
+    maxsize=1024, overflow=Overflow.drop_oldest, down_overflow=Overflow.block,
+    handlers=None, batch=None, reuse_port=None, executor=None, multicast=False,
+    mixins=()
+):
+    """
+    Creates a node for inter-application messaging.
+
+    """
+    if transport != "udp":
+        raise NotImplementedError("No '{}' transport for nodes.".format(transport))
+
+    loop = loop or asyncio.get_event_loop()
+    down = down if down is not None else BoundedQueue(maxsize, down_overflow, loop=loop)
+    up = up if up is not None else BoundedQueue(maxsize, overflow, loop=loop)
+    dispatcher = Dispatcher(loop, handlers, batch) if handlers or batch else None
+
+    types = Assembly.register(Policy)
+    policies = Policy(
+        poa=["udp", "multicast"] if multicast else ["udp"], role=[], routing=["application"]
+    )
+    services = await loop.run_in_executor(None, node_services, token, policies)
 
     udp = next(iter(policies.poa))
-    Mix = type("UdpNode", tuple(services), {})
-    transport, protocol = loop.run_until_complete(
-        loop.create_datagram_endpoint(
-            lambda:Mix(loop, token, types, down=down, up=up, **policies._asdict()),
-            local_addr=(udp.addr, udp.port)
-        )
+    Mix = node_class(tuple(mixins) + tuple(services))
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda:Mix(
+            loop, token, types, down=down, up=up, rate=rate, burst=burst,
+            executor=executor, dispatcher=dispatcher, **policies._asdict()
+        ),
+        local_addr=(udp.addr, udp.port),
+        reuse_port=reuse_port
     )
+    sock = transport.get_extra_info("socket")
+    for option, size in ((socket.SO_SNDBUF, sndbuf), (socket.SO_RCVBUF, rcvbuf)):
+        if size:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+
+    groups = policies.poa[1:]
+    if multicast or groups:
+        # Send to multicast groups from the same interface.
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(udp.addr))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    for group in groups:
+        await protocol.join(group, udp.addr)
     return protocol
+
+def advertise(token, poa):
+    """
+    Finds or creates the flows for an application hosted on another
+    node, and records in them the POA of that node.
+
+    This function works on the filesystem, and blocks.
+
+    """
+    policies = Policy(poa=["udp"], role=[], routing=["application"])
+    with flow_lock:
+        refs = list(match_policy(token, policies) or Flow.create(token, **policies._asdict()))
+        for ref in refs:
+            if ref is not None and ref.policy == "udp":
+                Flow.replace(ref, poa)
+    return refs
+
+async def start_host(token, down=None, up=None, transport="udp", *, loop=None, **kwargs):
+    """
+    Creates a node which can host many applications on one endpoint.
+
+    """
+    return await start_node(
+        token, down, up, transport, loop=loop, mixins=(Hosting,), **kwargs
+    )
+
+async def host(
+    node, token, up=None, *, loop=None,
+    maxsize=1024, overflow=Overflow.drop_oldest, handlers=None, batch=None
+):
+    """
+    Adds an application to a node created by `start_host`.
+
+    """
+    loop = loop or node.loop
+    poa = next(iter(node.policy.poa))
+    await loop.run_in_executor(None, advertise, token, poa)
+
+    up = up if up is not None else BoundedQueue(maxsize, overflow, loop=loop)
+    attach = getattr(up, "attach", None)
+    if attach is not None and node.transport is not None:
+        attach(node.transport)
+
+    dispatcher = Dispatcher(loop, handlers, batch) if handlers or batch else None
+    node.hosted[token.application] = Hosted(token, up, dispatcher)
+    return up
+
+def create_udp_node(
+    loop, token, down=None, up=None, rate=None, burst=None, sndbuf=None, rcvbuf=None,
+    maxsize=1024, overflow=Overflow.drop_oldest, down_overflow=Overflow.block,
+    handlers=None, batch=None, reuse_port=None, executor=None, multicast=False
+):
+    """
+    Creates a node which uses UDP for inter-application messaging
+
+    """
+    assert loop.__class__.__name__.endswith("SelectorEventLoop")
+    return loop.run_until_complete(
+        start_node(
+            token, down, up, "udp", loop=loop,
+            rate=rate, burst=burst, sndbuf=sndbuf, rcvbuf=rcvbuf,
+            maxsize=maxsize, overflow=overflow, down_overflow=down_overflow,
+            handlers=handlers, batch=batch, reuse_port=reuse_port, executor=executor, multicast=multicast
+        )
+    )
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+
+
+class TokenBucket:
+    """
+    Paces a flow of bytes to a steady rate, allowing short bursts.
+
+    :param rate: The sustained rate in bytes per second.
+    :param burst: The number of bytes which may be sent without delay.
+    :param clock: A function returning a monotonic time in seconds.
+
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.stamp = clock()
+
+    def delay(self, size):
+        """
+        Reserves capacity for `size` bytes. Returns the number of seconds
+        to wait before sending them.
+
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= size
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def socket_drops(sock):
+    """
+    Returns the number of datagrams the kernel has dropped for a socket,
+    or `None` if the operating system does not report it.
+
+    """
+    try:
+        inode = str(os.fstat(sock.fileno()).st_ino)
+    except (AttributeError, OSError):
+        return None
+
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(path, "r") as table:
+                # Columns end with: inode ref pointer drops
+                for line in table:
+                    fields = line.split()
+                    if len(fields) > 12 and fields[9] == inode:
+                        return int(fields[-1])
+        except (OSError, ValueError):
+            continue
+    return None
@@ -17,8 +17,10 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import namedtuple
+import ipaddress
 import itertools
 import json
+import random
 import warnings
 
 import turberfield.ipc.delivery
@@ -49,6 +51,33 @@ class POA:
             self.addr = addr
             self.port = port
 
+    class Multicast(Pooled, SavesAsDict):
+        """
+        An IP multicast group for all the applications of a service.
+
+        The first application to ask is allocated a group at random from
+        the `addr` network. The others find it in the DIF and join it too.
+
+        """
+
+        mechanism = None
+
+        @classmethod
+        def allocate(cls, addr="239.255.0.0/16", ports=slice(49152, 65535, 1), others=[]):
+            group = next((i for i in others if i is not None), None)
+            if group is not None:
+                return cls(group.addr, group.port)
+
+            net = ipaddress.IPv4Network(addr)
+            return cls(
+                str(net[random.randrange(1, net.num_addresses - 1)]),
+                random.randrange(ports.start, ports.stop, ports.step)
+            )
+
+        def __init__(self, addr, port):
+            self.addr = addr
+            self.port = port
+
 class Routing:
     """
         Advertised through turberfield.ipc.routing entry point.
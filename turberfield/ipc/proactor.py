@@ -17,16 +17,28 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import codecs
+from collections import defaultdict
+from collections import deque
 from collections import namedtuple
 from collections import OrderedDict
 import configparser
+import functools
+import heapq
 import io
 import itertools
 import logging
 import multiprocessing
+import os
+import re
+import runpy
+import signal
+import socket
+import stat
 import subprocess
 import sys
 import textwrap
+import time
 import uuid
 
 from turberfield.utils.misc import config_parser
@@ -34,9 +46,657 @@ from turberfield.utils.misc import clone_config_section
 from turberfield.utils.misc import reference_config_section
 
 
+try:
+    CLK_TCK = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError):
+    CLK_TCK = PAGE_SIZE = None
+
+# Finds the section names in extended interpolations, eg: ${section:key}
+interpolated = re.compile("\\$\\{([^:}]+):[^}]+\\}")
+
+def referenced_sections(cfg, name):
+    """Return the name of a configuration section, followed by the names of
+    all the sections which its values refer to by interpolation.
+
+    :param cfg: A `configparser.ConfigParser` object.
+    :param name: The name of a section.
+    :rtype: list
+    """
+    rv = OrderedDict([])
+    names = [name]
+    while names:
+        name = names.pop(0)
+        if name in rv or not cfg.has_section(name):
+            continue
+        rv[name] = None
+        for key, val in cfg.items(name, raw=True):
+            names.extend(interpolated.findall(val or ""))
+    return list(rv)
+
+def write_sections(cfg, names, fObj):
+    """Write only some sections of a configuration, with its defaults.
+    Values are written as they were read, so interpolations between those
+    sections still work.
+
+    :param cfg: A `configparser.ConfigParser` object.
+    :param names: A sequence of section names.
+    :param fObj: A file stream object.
+    """
+    defaults = cfg.defaults()
+    rv = configparser.RawConfigParser(defaults=defaults, allow_no_value=True)
+    for name in names:
+        rv.add_section(name)
+        for key, val in cfg.items(name, raw=True):
+            if key not in defaults or defaults[key] != val:
+                rv.set(name, key, val)
+    rv.write(fObj)
+    return fObj
+
+class ConfigReader(asyncio.Protocol):
+    """
+    Parses a configuration as it arrives on a pipe. Complete sections are
+    parsed as each chunk of data is received.
+
+    The read fails with `asyncio.TimeoutError` if no data arrives for
+    `timeout` seconds, and with `ValueError` if there is more than
+    `limit` bytes of it.
+
+    :param cfg: A `configparser.ConfigParser` object.
+    :param loop: An asyncio event loop.
+    :param timeout: An idle interval in seconds.
+    :param limit: The greatest size of the configuration in bytes.
+    :param source: A name for the configuration in error messages.
+
+    The attribute `done` is a future which resolves to the number of
+    bytes read.
+
+    """
+
+    def __init__(self, cfg, loop, timeout, limit, source="<stdin>"):
+        self.cfg = cfg
+        self.loop = loop
+        self.timeout = timeout
+        self.limit = limit
+        self.source = source
+        self.done = loop.create_future()
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.size = 0
+        self.tail = ""
+        self.lines = []
+        self.lineno = 0
+        self.seen = set()
+        self.transport = None
+        self.handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.reset()
+
+    def connection_lost(self, exc):
+        if exc is None:
+            self.eof_received()
+        else:
+            self.finish(exc)
+
+    def data_received(self, data):
+        if self.done.done():
+            return
+        self.size += len(data)
+        if self.size > self.limit:
+            self.finish(ValueError(
+                "Configuration exceeds {0} bytes.".format(self.limit)
+            ))
+            return
+        self.reset()
+        try:
+            self.feed(self.decoder.decode(data))
+        except (configparser.Error, UnicodeDecodeError) as e:
+            self.finish(e)
+
+    def eof_received(self):
+        if self.done.done():
+            return
+        try:
+            text = self.decoder.decode(b"", final=True)
+            if self.tail or text:
+                self.feed(text + "\n")
+            self.parse()
+        except (configparser.Error, UnicodeDecodeError) as e:
+            self.finish(e)
+        else:
+            self.finish()
+
+    def feed(self, text):
+        lines = (self.tail + text).split("\n")
+        self.tail = lines.pop()
+        complete = 0
+        for line in lines:
+            self.lineno += 1
+            match = self.cfg.SECTCRE.match(line)
+            if match:
+                complete = len(self.lines)
+                name = match.group("header")
+                if self.cfg._strict and name in self.seen:
+                    raise configparser.DuplicateSectionError(
+                        name, self.source, self.lineno
+                    )
+                self.seen.add(name)
+            self.lines.append(line + "\n")
+        self.parse(complete)
+
+    def parse(self, n=None):
+        """Parse the first `n` lines held, or all of them. Each read by the
+        parser costs time in proportion to all the sections it has, so
+        the lines are parsed in batches, not section by section.
+
+        """
+        n = len(self.lines) if n is None else n
+        if n > 0:
+            text, self.lines = "".join(self.lines[:n]), self.lines[n:]
+            self.cfg.read_string(text, source=self.source)
+
+    def reset(self):
+        if self.handle is not None:
+            self.handle.cancel()
+        self.handle = self.loop.call_later(self.timeout, self.expire)
+
+    def expire(self):
+        self.handle = None
+        self.finish(asyncio.TimeoutError())
+
+    def finish(self, exc=None):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if self.transport is not None:
+            self.transport.close()
+        if not self.done.done():
+            if exc is None:
+                self.done.set_result(self.size)
+            else:
+                self.done.set_exception(exc)
+
+class PortPool:
+    """
+    Allocates port numbers from a range, lowest first.
+
+    Ports are handed out from a pointer which only moves up the range.
+    Ports which are released go on a heap, and are reused before the
+    pointer moves again.
+
+    :param lo: The lowest port in the range.
+    :param hi: The highest port in the range.
+    :param busy: An optional sequence of ports which are not to be allocated.
+    :param max_held: The greatest number of ports to :py:meth:`hold`.
+    :param clock: A function returning a monotonic time in seconds.
+
+    """
+
+    def __init__(self, lo, hi, busy=(), max_held=16, clock=time.monotonic):
+        self.lo = lo
+        self.hi = hi
+        self.next = lo
+        self.free = []
+        self.taken = set(busy)
+        self.held = OrderedDict()
+        self.max_held = max_held
+        self.clock = clock
+
+    def __contains__(self, port):
+        return port in self.taken
+
+    def take(self, port):
+        """
+        Marks a port as in use.
+
+        """
+        self.taken.add(port)
+
+    def allocate(self):
+        """
+        Returns the lowest free port, or `None` if there are none left.
+
+        """
+        now = self.clock()
+        for port, until in list(self.held.items()):
+            if until <= now:
+                self.release(port)
+
+        while self.free:
+            port = heapq.heappop(self.free)
+            if port not in self.taken:
+                self.taken.add(port)
+                return port
+
+        while self.next <= self.hi:
+            port = self.next
+            self.next += 1
+            if port not in self.taken:
+                self.taken.add(port)
+                return port
+
+        return None
+
+    def release(self, port):
+        """
+        Returns a port to the pool.
+
+        """
+        self.held.pop(port, None)
+        if port in self.taken:
+            self.taken.discard(port)
+            if self.lo <= port < self.next:
+                heapq.heappush(self.free, port)
+
+    def hold(self, port, seconds=60):
+        """
+        Keeps a taken port from use for a while, eg: because something
+        outside the pool is bound to it. It is released after `seconds`.
+        No more than `max_held` ports are held; beyond that, the one held
+        longest is released early.
+
+        """
+        if port not in self.taken:
+            return
+        self.held.pop(port, None)
+        self.held[port] = self.clock() + seconds
+        while len(self.held) > self.max_held:
+            self.release(next(iter(self.held)))
+
+class Timings:
+    """
+    Keeps statistics of the startup times of the jobs of one module.
+
+    """
+
+    def __init__(self):
+        self.ready = 0
+        self.failed = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    @property
+    def mean(self):
+        return self.total / self.ready if self.ready else None
+
+    def add(self, seconds):
+        self.ready += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.last = seconds
+
+    def fail(self):
+        self.failed += 1
+
+    def _asdict(self):
+        return OrderedDict([
+            ("ready", self.ready), ("failed", self.failed), ("mean", self.mean),
+            ("min", self.min), ("max", self.max), ("last", self.last)
+        ])
+
+class Supervisor:
+    """
+    Applies a restart policy to the jobs of one module.
+
+    A job which fails is restarted after a delay. The delay doubles
+    (by `factor`) with each consecutive failure. A job which exits with
+    code zero has finished, and is not restarted.
+
+    :param backoff: The delay in seconds before the first restart.
+    :param factor: The growth of the delay with each consecutive failure.
+    :param max_backoff: The greatest delay in seconds.
+    :param limit: The most restarts permitted in `window` seconds. Beyond
+        this, the module is in `crashloop` state, and its jobs are not
+        restarted.
+    :param window: An interval in seconds. A job which runs for longer
+        than this resets the count of consecutive failures.
+
+    The attribute `state` is one of `ok`, `backoff` or `crashloop`.
+    The attribute `exits` keeps the most recent exits of jobs.
+
+    """
+
+    Exit = namedtuple("Exit", ["guid", "code", "duration", "ts"])
+
+    def __init__(
+        self, backoff=0.5, factor=2.0, max_backoff=60.0, limit=5, window=60.0,
+        clock=time.monotonic
+    ):
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.state = "ok"
+        self.failures = 0
+        self.restarts = deque([])
+        self.exits = deque([], maxlen=32)
+
+    def exited(self, guid, code, duration):
+        """Record the exit of a job. Returns the delay in seconds before it
+        should be restarted, or `None` if it should not be.
+
+        """
+        now = self.clock()
+        self.exits.append(self.Exit(guid, code, duration, time.time()))
+        if code == 0:
+            return None
+
+        if duration >= self.window:
+            self.failures = 0
+        self.failures += 1
+
+        while self.restarts and now - self.restarts[0] > self.window:
+            self.restarts.popleft()
+        if len(self.restarts) >= self.limit:
+            self.state = "crashloop"
+            return None
+
+        self.restarts.append(now)
+        self.state = "backoff"
+        return min(self.max_backoff, self.backoff * self.factor ** (self.failures - 1))
+
+    def started(self, guid):
+        """Record that a job is ready. This ends a `backoff`, and a
+        `crashloop` once there has been no restart for `window` seconds.
+
+        """
+        if self.state == "backoff":
+            self.state = "ok"
+        elif self.state == "crashloop" and (
+            not self.restarts or self.clock() - self.restarts[-1] > self.window
+        ):
+            self.reset()
+
+    def reset(self):
+        """Clear the count of failures, so that the jobs of the module
+        are restarted again.
+
+        """
+        self.state = "ok"
+        self.failures = 0
+        self.restarts.clear()
+
+    def _asdict(self):
+        return OrderedDict([
+            ("state", self.state), ("failures", self.failures),
+            ("exits", [i._asdict() for i in self.exits]),
+        ])
+
+Usage = namedtuple("Usage", ["cpu", "rss", "threads"])
+
+def usage(pid):
+    """Return the resources used by a process, from a single read of
+    `/proc/<pid>/stat`. The `cpu` field is user and system time in seconds.
+    The `rss` field is resident memory in bytes.
+
+    Returns `None` where there is no such process, or no `/proc`.
+
+    :rtype: :py:class:`Usage <turberfield.ipc.proactor.Usage>`
+    """
+    if CLK_TCK is None or pid is None:
+        return None
+    try:
+        with open("/proc/{0}/stat".format(pid), "rb") as stat:
+            data = stat.read()
+    except OSError:
+        return None
+
+    # The command name is in parentheses, and may contain spaces.
+    fields = data[data.rindex(b")") + 2:].split()
+    return Usage(
+        (int(fields[11]) + int(fields[12])) / CLK_TCK,
+        int(fields[21]) * PAGE_SIZE,
+        int(fields[17])
+    )
+
+class JobTable:
+    """
+    Records jobs by guid, in the order they were launched. Each state has
+    an index of its guids, so the jobs in one state are found without a scan
+    of them all.
+
+    :param history: The greatest number of finished jobs to keep. Beyond
+        this, the record of the oldest is dropped.
+    :param clock: A function which returns the time in seconds since
+        the epoch.
+
+    A job is `pending` from launch until it is ready, and while it waits to
+    be restarted. It is then `running`. A job which finishes is `exited` if
+    its code was zero, and `failed` otherwise.
+
+    """
+
+    Job = namedtuple("Job", ["guid", "module", "state", "since", "worker", "kwargs"])
+    STATES = ("pending", "running", "failed", "exited")
+
+    def __init__(self, history=1024, clock=time.time):
+        self.history = history
+        self.clock = clock
+        self.records = OrderedDict()
+        self.index = OrderedDict((i, OrderedDict()) for i in self.STATES)
+        self.finished = OrderedDict()
+
+    def __contains__(self, guid):
+        return guid in self.records
+
+    def __getitem__(self, guid):
+        return self.records[guid]
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, guid, default=None):
+        return self.records.get(guid, default)
+
+    def counts(self):
+        return OrderedDict((k, len(v)) for k, v in self.index.items())
+
+    def update(self, guid, state, module=None, worker=None, kwargs=None):
+        """Record the new state of a job.
+
+        :param guid: The guid of the job.
+        :param state: One of `STATES`.
+        :param module: The module of the job. Where not given, it is kept
+            from the previous record.
+        :param worker: An :py:class:`Initiator.Worker
+            <turberfield.ipc.proactor.Initiator.Worker>`, or `None`.
+        :param kwargs: The keyword arguments the job was launched with.
+            Where not given, they are kept from the previous record.
+        :rtype: :py:class:`JobTable.Job <turberfield.ipc.proactor.JobTable.Job>`
+        """
+        index = self.index[state]
+        prev = self.records.get(guid)
+        if prev is not None:
+            del self.index[prev.state][guid]
+            module = module or prev.module
+            kwargs = prev.kwargs if kwargs is None else kwargs
+
+        rv = self.records[guid] = self.Job(
+            guid, module, state, self.clock(), worker, kwargs or {}
+        )
+        index[guid] = None
+
+        if state in ("failed", "exited"):
+            self.finished.pop(guid, None)
+            self.finished[guid] = None
+            while len(self.finished) > self.history:
+                self.discard(next(iter(self.finished)))
+        else:
+            self.finished.pop(guid, None)
+        return rv
+
+    def discard(self, guid):
+        job = self.records.pop(guid, None)
+        if job is not None:
+            del self.index[job.state][guid]
+            self.finished.pop(guid, None)
+        return job
+
+    def page(self, state=None, offset=0, limit=None):
+        """Return a list of jobs, in the order they were launched or, for
+        those of a given state, in the order they entered it.
+
+        Raises `KeyError` for an unknown state.
+
+        :param state: One of `STATES`, or `None` for all jobs.
+        :param offset: The number of jobs to skip.
+        :param limit: The greatest number of jobs to return.
+        """
+        if state is None:
+            jobs = iter(self.records.values())
+        else:
+            jobs = (self.records[i] for i in self.index[state])
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(jobs, offset, stop))
+
+    @staticmethod
+    def summary(job):
+        """Return a description of a job, with its current resource
+        :py:func:`usage <turberfield.ipc.proactor.usage>` if it is running.
+
+        :rtype: dict
+        """
+        worker = job.worker
+        process = worker and worker.process
+        pid = process and process.pid
+        stats = usage(pid) if job.state == "running" else None
+        return OrderedDict([
+            ("guid", job.guid),
+            ("module", getattr(job.module, "__name__", None)),
+            ("state", job.state),
+            ("since", job.since),
+            ("port", worker and worker.port),
+            ("pid", pid),
+            ("returncode", process and process.returncode),
+            ("usage", stats and stats._asdict()),
+        ])
+
+def run_module(name, args, config, stdout):
+    """Run an executable module in a process forked by a
+    :py:class:`Zygote <turberfield.ipc.proactor.Zygote>`.
+
+    The module sees its configuration on standard input, and its standard
+    output goes back to the Initiator, as if it had been launched with
+    `python -m`.
+    """
+    sys.argv = [name] + list(args)
+    sys.stdin = io.StringIO(config)
+    sys.stdout = io.TextIOWrapper(
+        io.FileIO(os.dup(stdout.fileno()), "w"), encoding="utf-8", write_through=True
+    )
+    stdout.close()
+    runpy.run_module(name, run_name="__main__", alter_sys=True)
+
+class Forked:
+    """
+    Gives a process forked by a :py:class:`Zygote <turberfield.ipc.proactor.Zygote>`
+    the interface of an `asyncio.subprocess.Process`, as far as an
+    Initiator needs it.
+
+    """
+
+    def __init__(self, process, stdout, loop):
+        self.process = process
+        self.stdout = stdout
+        self.loop = loop
+        self.exit = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def returncode(self):
+        return self.process.exitcode
+
+    def kill(self):
+        if self.process.exitcode is None:
+            os.kill(self.process.pid, signal.SIGKILL)
+
+    async def wait(self):
+        if self.process.exitcode is None:
+            if self.exit is None:
+                self.exit = self.loop.create_future()
+                self.loop.add_reader(self.process.sentinel, self.exited)
+            await asyncio.shield(self.exit)
+        return self.process.exitcode
+
+    def exited(self):
+        self.loop.remove_reader(self.process.sentinel)
+        self.process.join()
+        if not self.exit.done():
+            self.exit.set_result(self.process.exitcode)
+
+class Zygote:
+    """
+    Forks jobs from a template process which has already imported the
+    modules they need. This saves each job the cost of starting an
+    interpreter and importing its dependencies.
+
+    The template is a `multiprocessing` forkserver. It is available
+    only on Unix platforms.
+
+    Jobs are not daemonic, so they may start processes of their own, eg:
+    a `ProcessPoolExecutor`. As with jobs launched by
+    `create_subprocess_exec`, they are left running when the Initiator
+    exits.
+
+    :param loop: An asyncio event loop.
+    :param preload: A sequence of names of modules to import in the template.
+        Modules which run as jobs may be included if their entry point
+        is guarded by `if __name__ == "__main__"`.
+
+    """
+
+    def __init__(self, loop, preload=()):
+        self.loop = loop
+        self.context = multiprocessing.get_context("forkserver")
+        self.context.set_forkserver_preload(list(preload))
+
+    async def spawn(self, name, args, config):
+        """Start a job in a forked process.
+
+        This is a *coroutine*.
+
+        :param name: The name of the module to run.
+        :param args: A sequence of command line arguments for the module.
+        :param config: The text of its configuration.
+        :rtype: :py:class:`Forked <turberfield.ipc.proactor.Forked>`
+        """
+        reader, writer = self.context.Pipe(duplex=False)
+        proc = self.context.Process(
+            target=run_module, args=(name, args, config, writer), daemon=False
+        )
+        try:
+            await self.loop.run_in_executor(None, proc.start)
+        finally:
+            writer.close()
+        # Otherwise multiprocessing joins the job when this process exits.
+        # Forked.wait reaps it instead.
+        getattr(multiprocessing.process, "_children", set()).discard(proc)
+
+        stdout = asyncio.StreamReader(loop=self.loop)
+        pipe = io.FileIO(os.dup(reader.fileno()), "r")
+        reader.close()
+        await self.loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(stdout, loop=self.loop), pipe
+        )
+        return Forked(proc, stdout, self.loop)
+
 class Proactor:
 
+    CONFIG_SIZE_MAX = 1024 * 1024
     CONFIG_TIMEOUT_SEC = 3
+    READY = "bound on {0}:{1}"
 
     def __init__(self, options, loop=None, **kwargs):
         """
@@ -53,32 +713,78 @@ class Proactor:
         self.cfg = config_parser(**kwargs)
         self.tasks = []
 
-    def read_config(self, fObj, timeout=CONFIG_TIMEOUT_SEC):
+    def read_config(self, fObj, timeout=CONFIG_TIMEOUT_SEC, limit=CONFIG_SIZE_MAX):
         """Read this object's configuration file from a file stream (eg: standard input).
 
-        This method will raise `asyncio.TimeoutError` if the configuration
-        is not seen within the timeout interval.
+        This method will raise `asyncio.TimeoutError` if no data is seen
+        for the timeout interval, and `ValueError` if the configuration is
+        larger than `limit` bytes.
 
         It runs within this object's event loop. 
 
         :param fObj: A file stream object.
-        :param timeout: A timeout interval in seconds.
+        :param timeout: An idle interval in seconds.
+        :param limit: The greatest size of the configuration in bytes.
         """
-        self.loop.run_until_complete(
-            asyncio.wait_for(
-                self.loop.run_in_executor(
-                    None, self.cfg.read_file, fObj
-                ),
-                timeout=timeout
-            )
+        return self.loop.run_until_complete(
+            self.receive_config(fObj, timeout=timeout, limit=limit)
         )
 
+    async def receive_config(
+        self, fObj, timeout=CONFIG_TIMEOUT_SEC, limit=CONFIG_SIZE_MAX
+    ):
+        """Read this object's configuration file from a file stream as it
+        arrives. Returns the number of bytes read.
+
+        This is a *coroutine*. See
+        :py:meth:`read_config <turberfield.ipc.proactor.Proactor.read_config>`
+        for its parameters.
+        """
+        reader = ConfigReader(
+            self.cfg, self.loop, timeout, limit,
+            source=getattr(fObj, "name", "<config>")
+        )
+        try:
+            mode = os.fstat(fObj.fileno()).st_mode
+        except (AttributeError, OSError, ValueError):
+            mode = 0
+
+        if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+            await self.loop.connect_read_pipe(lambda: reader, fObj)
+        else:
+            # A regular file, or a stream in memory.
+            for text in iter(functools.partial(fObj.read, 65536), ""):
+                reader.data_received(text.encode("utf-8"))
+                if reader.done.done():
+                    break
+            reader.eof_received()
+        return await reader.done
+
     def register_connection(self, guid, port=None):
         addr = self.cfg.get(guid, "listen_addr", fallback="0.0.0.0")
         port = port or self.cfg.getint(guid, "listen_port")
         self.cfg[guid]["listen_port"] = str(port)
         return addr, port
 
+    def ready(self, addr=None, port=None, stream=None):
+        """Signal to the parent process that this one is ready for work.
+        Call this once the job is serving. The parent is told the address
+        which the job is bound to, eg: `bound on 127.0.0.1:49152`.
+
+        :param addr: The address the job is bound to. If `None`, the value
+            from its configuration section.
+        :param port: The port the job is bound to. If `None`, the value
+            from its configuration section.
+        :param stream: The stream on which the parent waits. If `None`,
+            standard output.
+        """
+        guid = self.args.guid
+        addr = addr or self.cfg.get(guid, "listen_addr", fallback="0.0.0.0")
+        port = port or self.cfg.getint(guid, "listen_port")
+        stream = stream or sys.stdout
+        stream.write(self.READY.format(addr, port) + "\n")
+        stream.flush()
+
 class Initiator(Proactor):
 
     """
@@ -93,13 +799,31 @@ class Initiator(Proactor):
         ["guid", "port", "session", "module", "process"]
     )
 
+    CONFIG_HISTORY = 8
+    JOB_HISTORY = 1024
+    LAUNCH_LIMIT = 8
+    PORT_HOLD_SEC = 60
+    SUPERVISION = {}
+    # Matches Proactor.READY
+    bound = re.compile("bound on (?P<addr>.+):(?P<port>[0-9]+)$")
+    READY_TIMEOUT_SEC = Proactor.CONFIG_TIMEOUT_SEC + 2
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.queue = asyncio.Queue(loop=self.loop)
-        self.jobs = OrderedDict([])
+        self.launches = asyncio.Semaphore(self.LAUNCH_LIMIT, loop=self.loop)
+        self.metrics = defaultdict(Timings)
+        self.zygote = None
+        self.jobs = JobTable(history=self.JOB_HISTORY)
+        self.started = {}
+        self.snapshots = {}
+        self.revisions = itertools.count()
+        self.versions = {}
+        self.waiters = defaultdict(list)
+        self.supervisors = {}
         self.tasks.append(self.loop.create_task(self.job_runner()))
         self.log = logging.getLogger("turberfield.ipc.proactor.initiator")
-        self.busy = set([])
+        self.ports = None
 
     @staticmethod
     def next_port(cfg, guid, busy=set([])):
@@ -120,63 +844,328 @@ class Initiator(Proactor):
         )
         return next(iter(sorted(set(pool).difference(taken))), None)
 
+    def port_pool(self):
+        """Return the pool of ports for jobs. It is made from the configuration
+        the first time it is needed.
+
+        :rtype: :py:class:`PortPool <turberfield.ipc.proactor.PortPool>`
+        """
+        if self.ports is None:
+            self.ports = PortPool(
+                self.cfg.getint(self.args.guid, "child_port_min"),
+                self.cfg.getint(self.args.guid, "child_port_max"),
+                busy={
+                    self.cfg.getint(s, "listen_port", fallback=None)
+                    for s in self.cfg.sections()
+                } - {None}
+            )
+        return self.ports
+
+    def supervisor(self, module):
+        """Return the :py:class:`Supervisor <turberfield.ipc.proactor.Supervisor>`
+        for the jobs of a module. One with the policy given by `SUPERVISION`
+        is made if none has been set in `supervisors`.
+
+        """
+        try:
+            return self.supervisors[module.__name__]
+        except KeyError:
+            rv = self.supervisors[module.__name__] = Supervisor(**self.SUPERVISION)
+            return rv
+
     async def job_runner(self):
         self.log.info("Running jobs")
         try:
             while True:
-                guid = await self.queue.get()
-                job = self.jobs.get(guid)
-                if job:
-                    worker = await job
-                    self.log.debug(worker)
-                    if not worker.port:
-                        self.cfg.remove_section(guid)
-                        del self.jobs[guid]
-                        await self.launch(worker.module, worker.guid)
-                    else:
-                        self.jobs[guid] = worker
+                guid, job = await self.queue.get()
+                if getattr(self.jobs.get(guid), "state", None) == "pending":
+                    self.spawn(self.start_job(guid, job))
+                else:
+                    job.close()
         except asyncio.CancelledError:
             pass
 
-    async def worker(self, module, guid, interpreter=sys.executable, **kwargs):
-        port = self.next_port(self.cfg, self.args.guid, self.busy)
-        section = "\n".join(itertools.chain(
-            clone_config_section(self.cfg, module.__name__, guid, listen_port=port, **kwargs),
-            reference_config_section(
-                self.cfg, self.args.guid, parent_addr="listen_addr", parent_port="listen_port"
-            ),
+    def config_delta(self, guid, version=None):
+        """Return the values of a job's configuration section which have
+        changed since a version of it. A value of `None` marks a
+        key which has been removed. If that version is unknown, or too old
+        to be kept in `snapshots`, the whole section is returned.
+
+        This method does not change any state, so a job may ask again for
+        the same delta. It raises `KeyError` if there is no such job.
+
+        :param guid: The guid of the job.
+        :param version: The version of its configuration the job has.
+        :rtype: dict
+        """
+        history = self.snapshots[guid]
+        current = history[self.versions[guid]]
+        try:
+            sent = history[version]
+        except KeyError:
+            return dict(current)
+        rv = {k: v for k, v in current.items() if k not in sent or sent[k] != v}
+        rv.update({k: None for k in sent if k not in current})
+        return rv
+
+    def configure(self, name, **kwargs):
+        """Set values in a section of the configuration. Jobs whose
+        configuration refers to that section are notified of the change.
+
+        :param name: The name of a section.
+        :param kwargs: The values to set.
+        """
+        for key, val in kwargs.items():
+            self.cfg.set(name, key, val)
+        for guid in list(self.snapshots):
+            if name in referenced_sections(self.cfg, guid):
+                self.notify(guid)
+
+    def notify(self, guid):
+        """Mark a job's configuration as changed, and wake any requests
+        which wait for that. The section is kept as a new version in
+        `snapshots`, along with at most `CONFIG_HISTORY` older ones.
+
+        :param guid: The guid of the job.
+        """
+        version = self.versions[guid] = str(next(self.revisions))
+        history = self.snapshots.setdefault(guid, OrderedDict())
+        history[version] = dict(self.cfg.items(guid)) if self.cfg.has_section(guid) else {}
+        while len(history) > self.CONFIG_HISTORY:
+            history.popitem(last=False)
+        for waiter in self.waiters.pop(guid, []):
+            if not waiter.done():
+                waiter.set_result(guid)
+
+    async def config_changes(self, guid, version=None, timeout=30):
+        """Wait for a change to a job's configuration. A job which reports the
+        current version waits until there is a change, or until the timeout.
+
+        This is a *coroutine*. It raises `KeyError` if there is no such job.
+
+        :param guid: The guid of the job.
+        :param version: The version of its configuration the job has.
+        :param timeout: An interval in seconds.
+        :returns: A tuple of the current version, and the
+            :py:meth:`delta <turberfield.ipc.proactor.Initiator.config_delta>`
+            from the version the job has. The delta is `None` if there was no change.
+        """
+        current = self.versions[guid]
+        if version == current:
+            waiter = self.loop.create_future()
+            self.waiters[guid].append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=timeout, loop=self.loop)
+            except asyncio.TimeoutError:
+                return current, None
+            finally:
+                if waiter in self.waiters.get(guid, []):
+                    self.waiters[guid].remove(waiter)
+            current = self.versions[guid]
+
+        return current, self.config_delta(guid, version)
+
+    def spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self.tasks.append(task)
+        task.add_done_callback(self.tasks.remove)
+        return task
+
+    @staticmethod
+    def port_in_use(addr, port):
+        """Return `True` if a TCP port cannot be bound on this host."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((addr, port))
+            except OSError:
+                return True
+        return False
+
+    def release(self, guid, port, probe=False):
+        """Return the port of a job to the pool, and forget the versions
+        of its configuration.
+
+        :param guid: The guid of the job.
+        :param port: The port allocated to the job.
+        :param probe: If `True`, the port is first checked. One which is in
+            use outside the pool is held for `PORT_HOLD_SEC` instead.
+        """
+        pool = self.port_pool()
+        if port is not None:
+            addr = self.cfg.get(guid, "listen_addr", fallback="0.0.0.0")
+            if probe and self.port_in_use(addr, port):
+                self.log.warning("Port {0} is in use; holding it.".format(port))
+                pool.hold(port, self.PORT_HOLD_SEC)
+            else:
+                pool.release(port)
+        self.snapshots.pop(guid, None)
+        self.versions.pop(guid, None)
+
+    async def start_job(self, guid, job):
+        """Launch a job. No more than `LAUNCH_LIMIT` jobs are launched at once.
+
+        This is a *coroutine*.
+        """
+        try:
+            async with self.launches:
+                worker = await job
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            self.log.error("Job {0} failed to launch: {1!r}".format(guid, e))
+            self.cfg.remove_section(guid)
+            self.started.pop(guid, None)
+            self.jobs.update(guid, "failed")
+            return
+
+        self.log.debug(worker)
+        if not worker.port:
+            self.cfg.remove_section(guid)
+            await self.restart(worker)
+        else:
+            self.jobs.update(guid, "running", worker=worker)
+            self.supervisor(worker.module).started(guid)
+            self.spawn(self.reap(worker))
+
+    async def restart(self, worker):
+        """Restart a job which has failed, according to the policy of
+        the :py:class:`Supervisor <turberfield.ipc.proactor.Supervisor>`
+        for its module.
+
+        The job is launched again with the keyword arguments it was first
+        given. The port of the failed attempt has already been released, so a
+        relaunch allocates at most the one port it needs.
+
+        This is a *coroutine*.
+        """
+        code = worker.process.returncode
+        duration = time.monotonic() - self.started.pop(worker.guid, time.monotonic())
+        supervisor = self.supervisor(worker.module)
+        delay = supervisor.exited(worker.guid, code, duration)
+        if delay is None:
+            if code:
+                self.log.error("Job {0.guid} of {0.module.__name__} in crashloop".format(worker))
+            self.jobs.update(worker.guid, "failed" if code else "exited", worker=worker)
+            return
+
+        self.log.warning("Job {0} exited with code {1}; restart in {2:.1f}s".format(
+            worker.guid, code, delay
         ))
-        self.cfg.read_string(section)
-
-        args = [
-            interpreter,
-            "-m", module.__name__,
-            "--guid", guid,
-            "--port", str(port),
-        ]
-        proc = await asyncio.create_subprocess_exec(
-          *args, stdin=subprocess.PIPE, loop=self.loop
-        )
+        kwargs = self.jobs.update(worker.guid, "pending").kwargs
+        try:
+            await asyncio.sleep(delay, loop=self.loop)
+        except asyncio.CancelledError:
+            return
+        await self.launch(worker.module, worker.guid, **kwargs)
 
-        data = io.StringIO()
-        self.cfg.write(data)
-        proc.stdin.write(data.getvalue().encode("utf-8"))
-        await proc.stdin.drain()
-        proc.stdin.close()
+    async def reap(self, worker):
+        """Wait for a job to finish, then release its port and its
+        configuration section. The job is restarted if its supervisor
+        allows it.
 
-        job = asyncio.wait_for(
-            proc.wait(),
-            timeout=self.CONFIG_TIMEOUT_SEC + 2
-        )
+        This is a *coroutine*.
+        """
+        try:
+            stdout = worker.process.stdout
+            while stdout is not None:
+                line = await stdout.readline()
+                if not line:
+                    break
+                self.log.debug(line.decode("utf-8", "replace").rstrip())
+            rv = await worker.process.wait()
+        except asyncio.CancelledError:
+            return
+        self.log.info("Job {0.guid} exited with code {1}".format(worker, rv))
+        self.release(worker.guid, worker.port)
+        self.cfg.remove_section(worker.guid)
+        await self.restart(worker)
+
+    async def worker(self, module, guid, interpreter=sys.executable, **kwargs):
+        port = self.port_pool().allocate()
+        proc = None
         try:
-            await job
+            section = "\n".join(itertools.chain(
+                clone_config_section(self.cfg, module.__name__, guid, listen_port=port, **kwargs),
+                reference_config_section(
+                    self.cfg, self.args.guid, parent_addr="listen_addr", parent_port="listen_port"
+                ),
+            ))
+            self.cfg.read_string(section)
+
+            args = [
+                "--guid", guid,
+                "--port", str(port),
+            ]
+            data = write_sections(self.cfg, referenced_sections(self.cfg, guid), io.StringIO())
+            self.notify(guid)
+
+            then = self.started[guid] = time.monotonic()
+            if self.zygote is not None:
+                proc = await self.zygote.spawn(module.__name__, args, data.getvalue())
+            else:
+                proc = await asyncio.create_subprocess_exec(
+                  interpreter, "-m", module.__name__, *args,
+                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, loop=self.loop
+                )
+                proc.stdin.write(data.getvalue().encode("utf-8"))
+                await proc.stdin.drain()
+                proc.stdin.close()
+
+            bound = await asyncio.wait_for(
+                self.readiness(proc), timeout=self.READY_TIMEOUT_SEC, loop=self.loop
+            )
         except asyncio.TimeoutError:
-            return self.Worker(guid, port, None, module, proc)
-        else:
-            self.busy.add(port)
+            self.log.warning("Job {0} not ready; killing it.".format(guid))
+            proc.kill()
+            await proc.wait()
+            self.metrics[module.__name__].fail()
+            self.release(guid, port)
             return self.Worker(guid, None, None, module, proc)
+        except BaseException:
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+            self.release(guid, port)
+            raise
+
+        metrics = self.metrics[module.__name__]
+        if bound is None:
+            metrics.fail()
+            self.release(guid, port, probe=True)
+            return self.Worker(guid, None, None, module, proc)
+
+        latency = time.monotonic() - then
+        metrics.add(latency)
+        addr, bound = bound
+        if bound != port:
+            self.port_pool().release(port)
+            self.port_pool().take(bound)
+            self.cfg[guid]["listen_port"] = str(bound)
+            self.notify(guid)
+        self.log.info("Job {0} bound on {1}:{2} in {3:.3f}s".format(guid, addr, bound, latency))
+        return self.Worker(guid, bound, None, module, proc)
+
+    async def readiness(self, proc):
+        """Wait for the signal from a job that it is ready. Other output
+        is logged. Returns the address and port the job is bound to, or
+        `None` if the job finishes without signalling.
+
+        This is a *coroutine*.
+        """
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                await proc.wait()
+                return None
+
+            text = line.decode("utf-8", "replace").rstrip()
+            match = self.bound.match(text)
+            if match:
+                return match.group("addr"), int(match.group("port"))
+            else:
+                self.log.debug(text)
 
-    async def launch(self, module, guid=None):
+    async def launch(self, module, guid=None, **kwargs):
         """Schedule a job to be spawned in a worker process.
 
         This is a *coroutine*.
@@ -192,9 +1181,10 @@ class Initiator(Proactor):
             The module must read its configuration from the standard input stream.
         :param guid: A unique id for the job. There is usually no need to
             supply this parameter. It will be generated internally.
+        :param kwargs: Further values for the configuration section of the job.
         :returns: A guid to identify the new job.
         """
         guid = guid or uuid.uuid4().hex
-        self.jobs[guid] = self.worker(module, guid)
-        await self.queue.put(guid)
+        self.jobs.update(guid, "pending", module=module, kwargs=kwargs)
+        await self.queue.put((guid, self.worker(module, guid, **kwargs)))
         return guid
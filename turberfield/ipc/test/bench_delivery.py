@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import asyncio
+import functools
+import statistics
+import sys
+import time
+
+__doc__ = """
+Measures the latency of delivering a message to the `up` queue of a node,
+from the moment it is received until a consumer has it.
+
+Compares the former path (via `loop.call_soon_threadsafe`) with
+direct delivery from the event loop thread::
+
+    python -m turberfield.ipc.test.bench_delivery -n 100000
+
+"""
+
+
+def threadsafe(loop, queue, item):
+    loop.call_soon_threadsafe(functools.partial(queue.put_nowait, item))
+
+def direct(loop, queue, item):
+    queue.put_nowait(item)
+
+async def consumer(queue, n, results):
+    for i in range(n):
+        stamp = await queue.get()
+        results.append(time.perf_counter() - stamp)
+
+def measure(deliver, n):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    queue = asyncio.Queue()
+    results = []
+    task = loop.create_task(consumer(queue, n, results))
+
+    def receive(remaining):
+        # Simulates one datagram_received callback per loop iteration.
+        deliver(loop, queue, time.perf_counter())
+        if remaining > 1:
+            loop.call_soon(receive, remaining - 1)
+
+    loop.call_soon(receive, n)
+    loop.run_until_complete(task)
+    loop.close()
+    return results
+
+def main(args):
+    for name, deliver in (("call_soon_threadsafe", threadsafe), ("direct", direct)):
+        results = measure(deliver, args.n)
+        print("{0:>22}: mean {1:.2f} us, median {2:.2f} us".format(
+            name,
+            statistics.mean(results) * 1e6,
+            statistics.median(results) * 1e6
+        ))
+    return 0
+
+def run():
+    p = argparse.ArgumentParser(__doc__)
+    p.add_argument("-n", type=int, default=100000, help="Number of messages")
+    args = p.parse_args()
+    sys.exit(main(args))
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from turberfield.ipc.flow import Flow
+from turberfield.ipc.fsdb import token
+from turberfield.ipc.message import Address
+from turberfield.ipc.message import Alert
+from turberfield.ipc.message import parcel
+from turberfield.ipc.netstrings import dumpb
+import turberfield.ipc.demo.router
+
+from turberfield.utils.assembly import Assembly
+
+__doc__ = """
+Measures the forwarding throughput of the demo router against the number
+of its worker processes::
+
+    python -m turberfield.ipc.test.bench_router -n 50000 --workers 1 2 4
+
+Messages are sent from many sockets, since the kernel spreads datagrams
+across SO_REUSEPORT sockets by the address of the sender.
+
+"""
+
+
+def address(tok):
+    return Address(tok.namespace, tok.user, tok.service, tok.application)
+
+def poa(tok):
+    ref = next(Flow.find(tok, application=tok.application, policy="udp"), None)
+    return Flow.inspect(ref) if ref is not None else None
+
+def sink(sock, counts, done):
+    sock.settimeout(0.5)
+    while not done.is_set():
+        try:
+            sock.recvfrom(65536)
+        except socket.timeout:
+            continue
+        counts.append(time.perf_counter())
+
+def measure(workers, n, senders):
+    with tempfile.TemporaryDirectory() as root:
+        connect = "file://{0}".format(root)
+        router = token(connect, "demo", turberfield.ipc.demo.router.APP_NAME)
+        target = token(connect, "demo", "bench.sink")
+        list(Flow.create(target, poa=["udp"], role=[], routing=["application"]))
+        dst = poa(target)
+
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", turberfield.ipc.demo.router.APP_NAME,
+                "--connect", connect, "--workers", str(workers)
+            ],
+            start_new_session=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while poa(router) is None:
+                time.sleep(0.1)
+            time.sleep(1 + 0.2 * workers)
+            via = poa(router)
+
+            rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 ** 24)
+            rx.bind((dst.addr, dst.port))
+            counts = []
+            done = threading.Event()
+            thread = threading.Thread(target=sink, args=(rx, counts, done))
+            thread.start()
+
+            packet = dumpb(Assembly.dumps(
+                parcel(target, Alert(0, "bench"), dst=address(target))
+            ))
+            txs = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(senders)]
+            start = time.perf_counter()
+            for i in range(n):
+                txs[i % senders].sendto(packet, (via.addr, via.port))
+                if i % 256 == 0:
+                    time.sleep(0)
+
+            # Wait until the sink goes quiet.
+            seen = -1
+            while seen != len(counts):
+                seen = len(counts)
+                time.sleep(1)
+            done.set()
+            thread.join()
+            for i in txs + [rx]:
+                i.close()
+        finally:
+            os.killpg(proc.pid, signal.SIGINT)
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+
+    elapsed = (counts[-1] - start) if counts else float("nan")
+    return len(counts), elapsed
+
+def main(args):
+    print("{0:>8} {1:>10} {2:>10} {3:>12}".format("workers", "received", "secs", "msgs/sec"))
+    for workers in args.workers:
+        received, elapsed = measure(workers, args.n, args.senders)
+        print("{0:>8} {1:>10} {2:>10.2f} {3:>12.0f}".format(
+            workers, received, elapsed, received / elapsed
+        ))
+    return 0
+
+def run():
+    p = argparse.ArgumentParser(__doc__)
+    p.add_argument("-n", type=int, default=50000, help="Number of messages")
+    p.add_argument("--senders", type=int, default=32, help="Number of sending sockets")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts")
+    args = p.parse_args()
+    sys.exit(main(args))
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import socket
+import unittest
+
+from turberfield.ipc.bounded import BoundedQueue
+from turberfield.ipc.bounded import can_pause
+from turberfield.ipc.bounded import Overflow
+
+
+class BoundedQueueTests(unittest.TestCase):
+
+    class Transport:
+
+        def __init__(self):
+            self.reading = True
+
+        def pause_reading(self):
+            self.reading = False
+
+        def resume_reading(self):
+            self.reading = True
+
+        def is_closing(self):
+            return False
+
+    class Receiver(asyncio.DatagramProtocol):
+
+        def __init__(self, queue):
+            self.queue = queue
+
+        def datagram_received(self, data, addr):
+            self.queue.put_nowait(data)
+
+    class Unpausable:
+        """
+        A datagram transport as it was before Python 3.11.
+
+        """
+
+        def __init__(self, transport):
+            self.transport = transport
+
+        def __getattr__(self, name):
+            return getattr(self.transport, name)
+
+        def is_reading(self):
+            raise NotImplementedError
+
+        def pause_reading(self):
+            raise NotImplementedError
+
+        def resume_reading(self):
+            raise NotImplementedError
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_drop_oldest(self):
+        queue = BoundedQueue(4, Overflow.drop_oldest, loop=self.loop)
+        for i in range(10):
+            queue.put_nowait(i)
+        self.assertEqual(4, queue.qsize())
+        self.assertEqual(6, queue.get_nowait())
+        self.assertEqual(6, queue.stats["dropped"])
+        self.assertEqual(4, queue.hwm)
+
+    def test_drop_newest(self):
+        queue = BoundedQueue(4, Overflow.drop_newest, loop=self.loop)
+        for i in range(10):
+            queue.put_nowait(i)
+        self.assertEqual(4, queue.qsize())
+        self.assertEqual(0, queue.get_nowait())
+        self.assertEqual(6, queue.stats["dropped"])
+
+    def test_block(self):
+        queue = BoundedQueue(4, Overflow.block, loop=self.loop)
+        for i in range(4):
+            queue.put_nowait(i)
+        with self.assertRaises(asyncio.QueueFull):
+            queue.put_nowait(4)
+        self.assertEqual(4, queue.qsize())
+        self.assertEqual(0, queue.get_nowait())
+        self.assertEqual(1, queue.stats["refused"])
+        self.assertFalse(queue.stats["dropped"])
+
+    def test_pause_and_resume(self):
+        transport = BoundedQueueTests.Transport()
+        queue = BoundedQueue(4, Overflow.pause, loop=self.loop)
+        queue.attach(transport)
+        for i in range(4):
+            queue.put_nowait(i)
+        self.assertFalse(transport.reading)
+        self.assertTrue(queue.paused)
+
+        queue.get_nowait()
+        self.assertFalse(transport.reading)
+        queue.get_nowait()
+        self.assertTrue(transport.reading)
+        self.assertFalse(queue.paused)
+        self.assertEqual(1, queue.stats["paused"])
+
+    def datagrams(self, queue):
+        transport, protocol = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                lambda: BoundedQueueTests.Receiver(queue),
+                local_addr=("127.0.0.1", 0)
+            )
+        )
+        return transport
+
+    def test_pause_datagram_transport(self):
+        queue = BoundedQueue(4, Overflow.pause, loop=self.loop)
+        transport = self.datagrams(queue)
+        if not can_pause(transport):
+            transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.skipTest("Datagram transport cannot pause reading.")
+
+        queue.attach(transport)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for i in range(8):
+                sock.sendto(bytes([i]), transport.get_extra_info("sockname"))
+            self.loop.run_until_complete(asyncio.sleep(0.1))
+            self.assertTrue(queue.paused)
+            self.assertEqual(4, queue.qsize())
+            self.assertFalse(queue.stats["dropped"])
+
+            rv = [queue.get_nowait() for i in range(2)]
+            self.assertFalse(queue.paused)
+            self.loop.run_until_complete(asyncio.sleep(0.1))
+            while not queue.empty():
+                rv.append(queue.get_nowait())
+                self.loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual([bytes([i]) for i in range(8)], rv)
+        finally:
+            sock.close()
+            transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_pause_without_pause_reading(self):
+        queue = BoundedQueue(4, Overflow.pause, loop=self.loop)
+        transport = self.datagrams(queue)
+        with self.assertWarns(UserWarning):
+            queue.attach(BoundedQueueTests.Unpausable(transport))
+        self.assertIs(Overflow.drop_newest, queue.overflow)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for i in range(8):
+                sock.sendto(bytes([i]), transport.get_extra_info("sockname"))
+            self.loop.run_until_complete(asyncio.sleep(0.1))
+            self.assertFalse(queue.paused)
+            self.assertEqual(4, queue.stats["dropped"])
+            rv = [queue.get_nowait() for i in range(4)]
+            self.assertEqual([bytes([i]) for i in range(4)], rv)
+        finally:
+            sock.close()
+            transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_pause_fails(self):
+        class Failing(BoundedQueueTests.Transport):
+
+            def pause_reading(self):
+                raise OSError("Bad file descriptor")
+
+        transport = Failing()
+        queue = BoundedQueue(2, Overflow.pause, loop=self.loop)
+        queue.attach(transport)
+        with self.assertWarns(UserWarning):
+            for i in range(2):
+                queue.put_nowait(i)
+        queue.put_nowait(2)
+        self.assertIs(Overflow.drop_newest, queue.overflow)
+        self.assertEqual(1, queue.stats["dropped"])
+        self.assertEqual([0, 1], [queue.get_nowait() for i in range(2)])
+
+    def test_put_waits(self):
+        queue = BoundedQueue(1, loop=self.loop)
+        queue.put_nowait(0)
+        task = self.loop.create_task(queue.put(1))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(task.done())
+        self.assertEqual(0, queue.get_nowait())
+        self.loop.run_until_complete(task)
+        self.assertEqual(1, queue.get_nowait())
+        self.assertFalse(queue.stats["dropped"])
+
+    def test_maxsize_required(self):
+        with self.assertRaises(ValueError):
+            BoundedQueue(0, loop=self.loop)
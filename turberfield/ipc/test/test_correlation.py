@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import unittest
+
+from turberfield.ipc.correlation import Correlator
+from turberfield.ipc.correlation import Evicted
+from turberfield.ipc.correlation import TimerWheel
+from turberfield.ipc.message import Address
+from turberfield.ipc.message import Alert
+from turberfield.ipc.message import Header
+from turberfield.ipc.message import Message
+from turberfield.ipc.message import reply
+
+
+class TimerWheelTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_expiry_order(self):
+        wheel = TimerWheel(self.loop, tick=0.01, slots=4)
+        fired = []
+        for key, delay in (("c", 0.07), ("a", 0.01), ("b", 0.03)):
+            wheel.schedule(key, delay, fired.append)
+        self.loop.run_until_complete(asyncio.sleep(0.2, loop=self.loop))
+        self.assertEqual(["a", "b", "c"], fired)
+        self.assertIsNone(wheel.handle)
+
+    def test_cancel(self):
+        wheel = TimerWheel(self.loop, tick=0.01)
+        fired = []
+        slot = wheel.schedule("a", 0.02, fired.append)
+        wheel.cancel("a", slot)
+        self.loop.run_until_complete(asyncio.sleep(0.05, loop=self.loop))
+        self.assertFalse(fired)
+        self.assertEqual(0, wheel.count)
+
+
+class CorrelatorTests(unittest.TestCase):
+
+    src = Address("turberfield", "test", "test", "client")
+    dst = Address("turberfield", "test", "test", "server")
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def request(self, id):
+        return Message(Header(id, self.src, self.dst, 3, None, 0), (Alert(0, "ping"),))
+
+    def test_resolve(self):
+        replies = Correlator(self.loop)
+        msg = self.request(1)
+        future = replies.expect(msg)
+        self.assertFalse(replies.resolve(msg))
+        self.assertTrue(replies.resolve(reply(msg.header, Alert(0, "pong"))))
+        self.assertEqual("pong", future.result().payload[0].text)
+        self.assertFalse(replies.pending)
+
+    def test_resolve_self_addressed(self):
+        replies = Correlator(self.loop)
+        msg = Message(Header(1, self.src, self.src, 3, None, 0), (Alert(0, "ping"),))
+        future = replies.expect(msg)
+        # As routed to this node by its hop method.
+        copy = Message(msg.header._replace(via=self.src, hop=1), msg.payload)
+        self.assertFalse(replies.resolve(msg))
+        self.assertFalse(replies.resolve(copy))
+        self.assertFalse(future.done())
+        self.assertTrue(replies.resolve(reply(copy.header, Alert(0, "pong"))))
+        self.assertEqual("pong", future.result().payload[0].text)
+
+    def test_resolve_wildcard(self):
+        replies = Correlator(self.loop)
+        group = self.dst._replace(application="*")
+        msg = Message(Header(1, self.src, group, 3, None, 0), (Alert(0, "ping"),))
+        future = replies.expect(msg)
+        # As looped back from the multicast group, and decoded.
+        copy = Message(msg.header._replace(hop=1), (Alert(0, "ping"),))
+        self.assertFalse(replies.resolve(msg))
+        self.assertFalse(replies.resolve(copy))
+        self.assertFalse(future.done())
+        self.assertTrue(replies.resolve(reply(copy.header, Alert(0, "pong"))))
+        self.assertEqual("pong", future.result().payload[0].text)
+
+    def test_timeout(self):
+        replies = Correlator(self.loop, wheel=TimerWheel(self.loop, tick=0.01))
+        future = replies.expect(self.request(1), timeout=0.02)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(future)
+        self.assertEqual(1, replies.stats["expired"])
+
+    def test_bounded(self):
+        replies = Correlator(self.loop, maxsize=2)
+        futures = [replies.expect(self.request(i)) for i in range(3)]
+        self.assertFalse(futures[0].cancelled())
+        with self.assertRaises(Evicted):
+            futures[0].result()
+        self.assertEqual([1, 2], list(replies.pending))
+        self.assertEqual(1, replies.stats["evicted"])
+        for i in list(replies.pending):
+            replies.discard(i)
+        self.assertEqual(0, replies.wheel.count)
+
+    def test_same_id_cancels(self):
+        replies = Correlator(self.loop)
+        first = replies.expect(self.request(1))
+        second = replies.expect(self.request(1))
+        self.assertTrue(first.cancelled())
+        self.assertFalse(second.done())
+        self.assertEqual([1], list(replies.pending))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import os.path
+import tempfile
+import unittest
+
+from turberfield.ipc.delivery import PeerRouter
+from turberfield.ipc.flow import Flow
+from turberfield.ipc.fsdb import token
+from turberfield.ipc.policy import POA
+
+
+class RouteCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.token = token("file://{}".format(self.root.name), "test", "app")
+        self.peer = token("file://{}".format(self.root.name), "test", "peer")
+
+    def tearDown(self):
+        if os.path.isdir(self.root.name):
+            self.root.cleanup()
+        self.root = None
+
+    def test_no_route(self):
+        router = PeerRouter()
+        self.assertIsNone(router.route(self.token, "peer", "udp"))
+
+    def test_cached_route(self):
+        ref = next(Flow.create(self.peer, poa=["udp"], role=[], routing=[]))
+        router = PeerRouter()
+        poa = router.route(self.token, "peer", "udp")
+        self.assertEqual(Flow.inspect(ref).port, poa.port)
+        self.assertIs(poa, router.route(self.token, "peer", "udp"))
+
+    def test_route_invalidated(self):
+        ref = next(Flow.create(self.peer, poa=["udp"], role=[], routing=[]))
+        router = PeerRouter()
+        poa = router.route(self.token, "peer", "udp")
+        stamp = Flow.stamp(ref)
+        while Flow.stamp(ref) == stamp:
+            Flow.replace(ref, POA.UDP(poa.addr, poa.port + 1))
+        self.assertEqual(poa.port + 1, router.route(self.token, "peer", "udp").port)
@@ -16,12 +16,76 @@
 # You should have received a copy of the GNU General Public License
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import unittest
 
+import jwt
+
 from turberfield.ipc.demo.initiator import Authenticator
+from turberfield.ipc.demo.initiator import TokenCache
 
 class TokenTests(unittest.TestCase):
 
     def test_create(self):
         token = Authenticator.create_token("testsecret")
         self.assertTrue(token)
+
+class TokenCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TokenCache("testsecret", maxsize=2)
+
+    def test_check(self):
+        token = Authenticator.create_token("testsecret", session="abc")
+        payload = self.cache.check(token)
+        self.assertEqual("abc", payload["session"])
+        self.assertEqual(
+            payload, jwt.decode(token, "testsecret", algorithms=["HS256"])
+        )
+        self.assertIs(payload, self.cache.check(token))
+        self.assertEqual(1, self.cache.stats["hit"])
+        self.assertEqual(1, self.cache.stats["miss"])
+
+    def test_wrong_key(self):
+        token = Authenticator.create_token("othersecret")
+        self.assertIsNone(self.cache.check(token))
+        self.assertEqual(1, self.cache.stats["rejected"])
+        self.assertFalse(self.cache.verified)
+
+    def test_tampered(self):
+        token = Authenticator.create_token("testsecret", session="abc")
+        if isinstance(token, bytes):
+            token = token.decode("ascii")
+        header, payload, signature = token.split(".")
+        forged = jwt.encode({"session": "def"}, "othersecret", algorithm="HS256")
+        if isinstance(forged, bytes):
+            forged = forged.decode("ascii")
+        text = ".".join((header, forged.split(".")[1], signature))
+        self.assertIsNone(self.cache.check(text))
+        self.assertIsNone(self.cache.check("not.a.token"))
+        self.assertIsNone(self.cache.check(""))
+
+    def test_algorithm(self):
+        token = jwt.encode({"session": "abc"}, "testsecret", algorithm="HS512")
+        self.assertIsNone(self.cache.check(token))
+
+    def test_expiry(self):
+        now = time.time()
+        token = jwt.encode({"exp": int(now) + 10}, "testsecret", algorithm="HS256")
+        self.assertTrue(self.cache.check(token, now=now))
+        self.assertTrue(self.cache.check(token, now=now + 5))
+        self.assertIsNone(self.cache.check(token, now=now + 20))
+        self.assertFalse(self.cache.verified)
+
+    def test_maxsize(self):
+        tokens = [
+            Authenticator.create_token("testsecret", session=str(i))
+            for i in range(3)
+        ]
+        for token in tokens:
+            self.cache.check(token)
+        self.cache.check(tokens[1])
+        self.assertEqual(2, len(self.cache.verified))
+        self.assertEqual(
+            ["1", "2"], sorted(i["session"] for i in self.cache.verified.values())
+        )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import unittest
+
+from turberfield.ipc.dispatch import Dispatcher
+from turberfield.ipc.message import Address
+from turberfield.ipc.message import Alert
+from turberfield.ipc.message import Header
+from turberfield.ipc.message import Message
+from turberfield.ipc.message import Scalar
+
+
+class DispatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        here = Address("turberfield", "tundish", "test", "addisonarches.web")
+        self.header = Header("aa27e84fa93843658bfcd5b4f9ceee4f", here, here, 3, None, 0)
+        self.alert = Alert(datetime.datetime.now(), "Hello World!")
+        self.scalar = Scalar("temperature", "C", 21.5, None, None)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_handled_by_type(self):
+        seen = []
+        dispatcher = Dispatcher(self.loop, {Alert: lambda obj, msg: seen.append(obj)})
+        self.assertTrue(dispatcher(Message(self.header, [self.alert])))
+        self.assertEqual([self.alert], seen)
+
+    def test_unhandled(self):
+        seen = []
+        dispatcher = Dispatcher(self.loop, {Alert: lambda obj, msg: seen.append(obj)})
+        self.assertFalse(dispatcher(Message(self.header, [self.alert, self.scalar])))
+        self.assertFalse(dispatcher(Message(self.header, [])))
+        self.assertEqual([self.alert], seen)
+
+    def test_batch(self):
+        batches = []
+        dispatcher = Dispatcher(self.loop, batch=batches.append)
+        msgs = [Message(self.header, [self.scalar]) for i in range(3)]
+        self.assertTrue(all(dispatcher(i) for i in msgs))
+        self.assertFalse(batches)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual([msgs], batches)
+
+    def test_handler_error(self):
+        def broken(obj, msg):
+            raise ValueError(obj)
+
+        dispatcher = Dispatcher(self.loop, {Alert: broken})
+        with self.assertWarns(UserWarning):
+            self.assertTrue(dispatcher(Message(self.header, [self.alert])))
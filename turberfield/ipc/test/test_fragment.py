@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+import warnings
+
+from turberfield.ipc.fragment import fragment
+from turberfield.ipc.fragment import HEADER
+from turberfield.ipc.fragment import MARKER
+from turberfield.ipc.fragment import MAX_BYTES
+from turberfield.ipc.fragment import Reassembly
+from turberfield.ipc.netstrings import dumpb
+
+
+class FragmentTests(unittest.TestCase):
+
+    def test_small_packet_unchanged(self):
+        packet = dumpb("hello world!")
+        rv = list(fragment(packet, 1, mtu=64))
+        self.assertEqual([packet], rv)
+
+    def test_fragments_fit_mtu(self):
+        packet = dumpb("x" * 1000)
+        rv = list(fragment(packet, 1, mtu=64))
+        self.assertEqual(-(-len(packet) // (64 - HEADER.size)), len(rv))
+        self.assertTrue(all(len(i) <= 64 for i in rv))
+
+    def test_too_many_fragments(self):
+        packet = bytes(0x10000 * 2)
+        with self.assertRaises(ValueError):
+            list(fragment(packet, 1, mtu=HEADER.size + 1))
+
+    def test_too_big_to_reassemble(self):
+        packet = bytes(MAX_BYTES + 1)
+        with self.assertRaises(ValueError):
+            list(fragment(packet, 1))
+
+
+class ReassemblyTests(unittest.TestCase):
+
+    class Clock:
+
+        def __init__(self):
+            self.now = 0
+
+        def __call__(self):
+            return self.now
+
+    def setUp(self):
+        self.clock = ReassemblyTests.Clock()
+        self.packet = dumpb("x" * 1000)
+        self.frags = list(fragment(self.packet, 7, mtu=64))
+
+    def test_passthrough(self):
+        reassembly = Reassembly(clock=self.clock)
+        packet = dumpb("hello world!")
+        self.assertEqual(packet, reassembly.receive(packet, "a"))
+
+    def test_out_of_order(self):
+        reassembly = Reassembly(clock=self.clock)
+        frags = self.frags[:]
+        random.shuffle(frags)
+        rv = [reassembly.receive(i, "a") for i in frags]
+        self.assertEqual(self.packet, rv[-1])
+        self.assertFalse(any(rv[:-1]))
+        self.assertFalse(reassembly.partial)
+        self.assertEqual(0, reassembly.size)
+
+    def test_duplicates_suppressed(self):
+        reassembly = Reassembly(clock=self.clock)
+        reassembly.receive(self.frags[0], "a")
+        self.assertIsNone(reassembly.receive(self.frags[0], "a"))
+        for i in self.frags[1:]:
+            rv = reassembly.receive(i, "a")
+        self.assertEqual(self.packet, rv)
+        self.assertIsNone(reassembly.receive(self.frags[-1], "a"))
+        self.assertEqual(2, reassembly.stats["duplicate"])
+        self.assertFalse(reassembly.partial)
+
+    def test_senders_kept_apart(self):
+        reassembly = Reassembly(clock=self.clock)
+        for i in self.frags[:-1]:
+            reassembly.receive(i, "a")
+        self.assertIsNone(reassembly.receive(self.frags[-1], "b"))
+        self.assertEqual(self.packet, reassembly.receive(self.frags[-1], "a"))
+
+    def test_timeout(self):
+        reassembly = Reassembly(timeout=5, clock=self.clock)
+        for i in self.frags[:-1]:
+            reassembly.receive(i, "a")
+        self.clock.now = 6
+        self.assertIsNone(reassembly.receive(self.frags[-1], "a"))
+        self.assertEqual(1, reassembly.stats["expired"])
+        self.assertEqual(1, len(reassembly.partial))
+
+    def test_bounded_memory(self):
+        reassembly = Reassembly(mtu=64, max_bytes=2000, clock=self.clock)
+        for id in range(8):
+            for i in list(fragment(self.packet, id, mtu=64))[:-1]:
+                reassembly.receive(i, "a")
+                self.assertLessEqual(reassembly.size, 2000)
+        self.assertTrue(reassembly.stats["evicted"])
+
+    def test_space_reserved(self):
+        reassembly = Reassembly(mtu=64, max_bytes=2000, clock=self.clock)
+        reassembly.receive(self.frags[0], "a")
+        self.assertEqual(len(self.frags) * (64 - HEADER.size), reassembly.size)
+        for i in self.frags[1:]:
+            reassembly.receive(i, "a")
+        self.assertEqual(0, reassembly.size)
+
+    def test_oversize_rejected(self):
+        reassembly = Reassembly(clock=self.clock)
+        data = HEADER.pack(MARKER, 1, 0, 0xFFFF)
+        self.assertIsNone(reassembly.receive(data, "a"))
+        self.assertEqual(1, reassembly.stats["oversize"])
+        self.assertFalse(reassembly.partial)
+        self.assertEqual(0, reassembly.size)
+
+    def test_fragment_too_long(self):
+        reassembly = Reassembly(mtu=32, clock=self.clock)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertIsNone(reassembly.receive(self.frags[0], "a"))
+        self.assertTrue(caught)
+        self.assertFalse(reassembly.partial)
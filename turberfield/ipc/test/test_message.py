@@ -17,6 +17,7 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
 import os.path
 import tempfile
 import textwrap
@@ -180,6 +181,41 @@ class AddressingTester(unittest.TestCase):
         self.assertEqual(msg.header.src, msg.header.dst)
         self.assertIs(None, msg.header.via)
 
+    def test_address_interned(self):
+        tok = token(
+            "file://{}".format(self.root.name),
+            "test",
+            "addisonarches.web"
+        )
+        a = turberfield.ipc.message.parcel(tok)
+        b = turberfield.ipc.message.parcel(tok)
+        self.assertIs(a.header.src, a.header.dst)
+        self.assertIs(a.header.src, b.header.src)
+        self.assertIs(a.header.src, turberfield.ipc.types.address_of(tok))
+
+    def test_parcel_many(self):
+        tok = token(
+            "file://{}".format(self.root.name),
+            "test",
+            "addisonarches.web"
+        )
+        dsts = [
+            turberfield.ipc.message.Address("turberfield", "test", "test", str(i))
+            for i in range(3)
+        ]
+        msgs = turberfield.ipc.message.parcel_many(
+            tok, [turberfield.ipc.message.Alert(0, "Hello World!")], dsts
+        )
+        self.assertEqual(dsts, [i.header.dst for i in msgs])
+        self.assertIs(msgs[0].payload, msgs[-1].payload)
+
+        cache = {}
+        for msg in msgs:
+            data = turberfield.ipc.message.dumps(msg, cache)
+            self.assertEqual(Assembly.dumps(msg), data)
+            self.assertEqual(msg.header, Assembly.loads(data).header)
+        self.assertEqual(1, len(cache))
+
     def test_reply(self):
         app = "addisonarches.web"
         tok = token(
@@ -192,3 +228,52 @@ class AddressingTester(unittest.TestCase):
         self.assertEqual(msg.header.id, reply.header.id)
         self.assertEqual(msg.header.src, reply.header.dst)
         self.assertEqual(msg.header.dst, reply.header.src)
+
+    def test_parcel_ids(self):
+        tok = token(
+            "file://{}".format(self.root.name),
+            "test",
+            "addisonarches.web"
+        )
+        for ids in (
+            turberfield.ipc.message.counter_ids(),
+            turberfield.ipc.message.snowflake_ids(),
+            turberfield.ipc.message.uuid_ids(),
+        ):
+            with self.subTest(ids=ids):
+                msgs = [turberfield.ipc.message.parcel(tok, ids=ids) for i in range(100)]
+                self.assertEqual(100, len({i.header.id for i in msgs}))
+                data = Assembly.dumps(msgs[0])
+                self.assertEqual(msgs[0].header.id, Assembly.loads(data).header.id)
+
+class IdTester(unittest.TestCase):
+
+    def test_counter_prefix(self):
+        ids = turberfield.ipc.message.counter_ids("node")
+        self.assertEqual(["node.0", "node.1"], [next(ids), next(ids)])
+
+    @unittest.skipUnless(hasattr(os, "register_at_fork"), "No fork hooks")
+    def test_fork_reseeds(self):
+        before = next(turberfield.ipc.message.message_ids)
+        r, w = os.pipe()
+        pid = os.fork()
+        if not pid:
+            os.close(r)
+            os.write(w, next(turberfield.ipc.message.message_ids).encode("ascii"))
+            os._exit(0)
+
+        os.close(w)
+        with os.fdopen(r, "rb") as child:
+            rv = child.read().decode("ascii")
+        os.waitpid(pid, 0)
+        after = next(turberfield.ipc.message.message_ids)
+        self.assertNotEqual(before.split(".")[0], rv.split(".")[0])
+        self.assertEqual(before.split(".")[0], after.split(".")[0])
+
+    def test_snowflake_monotonic(self):
+        ids = turberfield.ipc.message.snowflake_ids(node=1, clock=lambda: 1451606400.5)
+        rv = [next(ids) for i in range(0x1001)]
+        self.assertEqual(sorted(rv), rv)
+        self.assertEqual(len(rv), len(set(rv)))
+        self.assertTrue(all(i < 2 ** 63 for i in rv))
+        self.assertEqual(1, (rv[0] >> 12) & 0x3FF)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import concurrent.futures
+import os.path
+import socket
+import tempfile
+import threading
+import unittest
+import warnings
+
+from turberfield.ipc import bounded
+from turberfield.ipc.bounded import Overflow
+from turberfield.ipc.flow import Flow
+from turberfield.ipc.fsdb import token
+from turberfield.ipc.message import Address
+from turberfield.ipc.message import Alert
+from turberfield.ipc.message import parcel
+from turberfield.ipc.message import parcel_many
+from turberfield.ipc.message import reply
+from turberfield.ipc.node import Handoff
+from turberfield.ipc.node import host
+from turberfield.ipc.node import match_policy
+from turberfield.ipc.node import node_class
+from turberfield.ipc.node import Policy
+from turberfield.ipc.node import start_host
+from turberfield.ipc.node import start_node
+from turberfield.ipc.types import address_of
+
+
+class HandoffTests(unittest.TestCase):
+
+    def test_cross_thread(self):
+        loop = asyncio.new_event_loop()
+        queue = asyncio.Queue(loop=loop)
+        handoff = Handoff(queue, loop)
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            for i in range(3):
+                handoff.put_nowait(i)
+            rv = asyncio.run_coroutine_threadsafe(
+                asyncio.wait_for(queue.get(), timeout=2, loop=loop), loop
+            ).result()
+            self.assertEqual(0, rv)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+class StartNodeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        if os.path.isdir(self.root.name):
+            self.root.cleanup()
+        self.root = None
+
+    def test_concurrent_start(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", "app{0}".format(i))
+            for i in range(4)
+        ]
+
+        async def start():
+            return await asyncio.gather(
+                *(start_node(i, loop=self.loop) for i in tokens), loop=self.loop
+            )
+
+        nodes = self.loop.run_until_complete(start())
+        try:
+            ports = {i.transport.get_extra_info("sockname")[1] for i in nodes}
+            self.assertEqual(4, len(ports))
+            # No multicast was asked for, so the sockets are left as they were.
+            for node in nodes:
+                sock = node.transport.get_extra_info("socket")
+                self.assertEqual(0, sock.getsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF))
+        finally:
+            for i in nodes:
+                i.transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+    def test_decode_in_executor(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", name)
+            for name in ("sender", "receiver")
+        ]
+        dst = Address(*(getattr(tokens[1], i) for i in Address._fields))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+        async def run():
+            sender = await start_node(tokens[0], loop=self.loop)
+            receiver = await start_node(tokens[1], loop=self.loop, executor=executor)
+            receiver.DECODE_THRESHOLD = 256
+            task = self.loop.create_task(sender())
+            try:
+                for text in ("x" * 1024, "small", "x" * 512, "last"):
+                    sender.down.put_nowait(parcel(tokens[0], Alert(0, text), dst=dst))
+                return [
+                    (await asyncio.wait_for(receiver.up.get(), timeout=2, loop=self.loop))
+                    for i in range(4)
+                ]
+            finally:
+                task.cancel()
+                sender.transport.close()
+                receiver.transport.close()
+
+        try:
+            msgs = self.loop.run_until_complete(run())
+        finally:
+            executor.shutdown()
+        self.assertEqual(
+            [1024, 5, 512, 4],
+            [len(i.payload[0].text) for i in msgs]
+        )
+
+    def test_send_batch(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", "app{0}".format(i))
+            for i in range(4)
+        ]
+        dsts = [address_of(i) for i in tokens[1:]]
+
+        async def run():
+            nodes = [await start_node(i, loop=self.loop) for i in tokens]
+            task = self.loop.create_task(nodes[0]())
+            try:
+                nodes[0].down.put_nowait(
+                    parcel_many(tokens[0], [Alert(0, "x" * 2048)], dsts)
+                )
+                return [
+                    (await asyncio.wait_for(i.up.get(), timeout=2, loop=self.loop))
+                    for i in nodes[1:]
+                ]
+            finally:
+                task.cancel()
+                for i in nodes:
+                    i.transport.close()
+
+        msgs = self.loop.run_until_complete(run())
+        self.assertEqual(dsts, [i.header.dst for i in msgs])
+        self.assertEqual(3, len({i.header.id for i in msgs}))
+        self.assertTrue(all(len(i.payload[0].text) == 2048 for i in msgs))
+
+    def test_pacing_per_peer(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", "app{0}".format(i))
+            for i in range(3)
+        ]
+
+        async def run():
+            nodes = [await start_node(i, loop=self.loop) for i in tokens]
+            slow = nodes[0].route(tokens[0], tokens[1].application, "udp")
+            nodes[0].pace(slow, rate=100, burst=1)
+            task = self.loop.create_task(nodes[0]())
+            try:
+                for i in tokens[1:]:
+                    nodes[0].down.put_nowait(
+                        parcel(tokens[0], Alert(0, "x" * 512), dst=address_of(i))
+                    )
+                rv = await asyncio.wait_for(nodes[2].up.get(), timeout=1, loop=self.loop)
+                return rv, nodes[1].up.qsize()
+            finally:
+                task.cancel()
+                for i in nodes:
+                    i.transport.close()
+
+        msg, waiting = self.loop.run_until_complete(run())
+        self.assertEqual(address_of(tokens[2]), msg.header.dst)
+        self.assertEqual(0, waiting)
+
+    def test_pacing_backlog(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", "app{0}".format(i))
+            for i in range(2)
+        ]
+
+        async def run():
+            nodes = [await start_node(i, loop=self.loop) for i in tokens]
+            slow = nodes[0].route(tokens[0], tokens[1].application, "udp")
+            nodes[0].pace(slow, rate=100, burst=1)
+            nodes[0].BACKLOG = 2
+            task = self.loop.create_task(nodes[0]())
+            try:
+                for i in range(5):
+                    nodes[0].down.put_nowait(
+                        parcel(tokens[0], Alert(0, "x" * 512), dst=address_of(tokens[1]))
+                    )
+                while not nodes[0].down.empty():
+                    await asyncio.sleep(0.01, loop=self.loop)
+                await asyncio.sleep(0.01, loop=self.loop)
+                return len(nodes[0].backlogs[(slow.addr, slow.port)]), nodes[0].stats
+            finally:
+                task.cancel()
+                for i in nodes:
+                    i.transport.close()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            held, stats = self.loop.run_until_complete(run())
+        self.assertEqual(2, held)
+        self.assertEqual(3, stats["dropped"])
+
+    def test_multicast(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", "app{0}".format(i))
+            for i in range(4)
+        ]
+        everyone = address_of(tokens[0])._replace(application="*")
+
+        async def run():
+            nodes = [await start_node(i, loop=self.loop, multicast=True) for i in tokens]
+            task = self.loop.create_task(nodes[0]())
+            try:
+                nodes[0].down.put_nowait(parcel(tokens[0], Alert(0, "all"), dst=everyone))
+                return [
+                    (await asyncio.wait_for(i.up.get(), timeout=2, loop=self.loop))
+                    for i in nodes
+                ]
+            finally:
+                task.cancel()
+                for i in nodes:
+                    i.transport.close()
+                await asyncio.sleep(0, loop=self.loop)
+
+        msgs = self.loop.run_until_complete(run())
+        self.assertEqual(1, len({i.header.id for i in msgs}))
+        self.assertEqual(["all"] * 4, [i.payload[0].text for i in msgs])
+        groups = [
+            Flow.inspect(i)
+            for i in Flow.find(tokens[0], application="*", policy="multicast")
+        ]
+        self.assertEqual(4, len(groups))
+        self.assertEqual(1, len({(i.addr, i.port) for i in groups}))
+
+    def test_request(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", name)
+            for name in ("client", "server")
+        ]
+
+        async def serve(node):
+            while True:
+                msg = await node.up.get()
+                node.down.put_nowait(reply(msg.header, Alert(0, "pong")))
+
+        async def run():
+            client, server = [await start_node(i, loop=self.loop) for i in tokens]
+            tasks = [
+                self.loop.create_task(i) for i in (client(), server(), serve(server))
+            ]
+            try:
+                msg = parcel(tokens[0], Alert(0, "ping"), dst=address_of(tokens[1]))
+                rv = await client.request(msg, timeout=2)
+                return rv, client.up.qsize()
+            finally:
+                for i in tasks:
+                    i.cancel()
+                client.transport.close()
+                server.transport.close()
+                await asyncio.sleep(0, loop=self.loop)
+
+        msg, queued = self.loop.run_until_complete(run())
+        self.assertEqual("pong", msg.payload[0].text)
+        self.assertEqual(0, queued)
+
+    def test_down_refuses_when_full(self):
+        tok = token("file://{}".format(self.root.name), "test", "app")
+
+        async def run():
+            node = await start_node(tok, loop=self.loop, maxsize=2)
+            try:
+                msgs = [
+                    parcel(tok, Alert(0, str(i)), dst=address_of(tok)) for i in range(3)
+                ]
+                for msg in msgs[:2]:
+                    node.down.put_nowait(msg)
+                with self.assertRaises(asyncio.QueueFull):
+                    node.request(msgs[2])
+                return node
+            finally:
+                node.transport.close()
+                await asyncio.sleep(0, loop=self.loop)
+
+        node = self.loop.run_until_complete(run())
+        self.assertEqual(2, node.down.qsize())
+        self.assertFalse(node.replies.pending)
+
+    def test_unknown_transport(self):
+        tok = token("file://{}".format(self.root.name), "test", "app")
+        with self.assertRaises(NotImplementedError):
+            self.loop.run_until_complete(start_node(tok, transport="tcp", loop=self.loop))
+
+
+class HostTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        if os.path.isdir(self.root.name):
+            self.root.cleanup()
+        self.root = None
+
+    def test_shared_endpoint(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", name)
+            for name in ("host", "app1", "app2")
+        ]
+        dst = Address(*(getattr(tokens[2], i) for i in Address._fields))
+
+        async def run():
+            node = await start_host(tokens[0], loop=self.loop)
+            task = self.loop.create_task(node())
+            try:
+                ups = [await host(node, i, loop=self.loop) for i in tokens[1:]]
+                node.down.put_nowait(parcel(tokens[1], Alert(0, "Hello"), dst=dst))
+                msg = await asyncio.wait_for(ups[1].get(), timeout=2, loop=self.loop)
+                return node, ups, msg
+            finally:
+                task.cancel()
+                node.transport.close()
+
+        node, ups, msg = self.loop.run_until_complete(run())
+        self.assertEqual("Hello", msg.payload[0].text)
+        self.assertTrue(ups[0].empty())
+        self.assertTrue(node.up.empty())
+
+        poa = next(iter(node.policy.poa))
+        for tok in tokens[1:]:
+            ref = next(Flow.find(tok, application=tok.application, policy="udp"))
+            self.assertEqual(poa.port, Flow.inspect(ref).port)
+
+
+    def test_shared_pause(self):
+        tokens = [
+            token("file://{}".format(self.root.name), "test", name)
+            for name in ("host", "app1", "app2")
+        ]
+
+        async def run():
+            node = await start_host(tokens[0], loop=self.loop)
+            if not bounded.can_pause(node.transport):
+                node.transport.close()
+                await asyncio.sleep(0, loop=self.loop)
+                return None
+            try:
+                ups = [
+                    await host(node, i, loop=self.loop, maxsize=2, overflow=Overflow.pause)
+                    for i in tokens[1:]
+                ]
+                for up in ups:
+                    for n in range(2):
+                        up.put_nowait(n)
+                rv = [bounded.paused[node.transport]]
+
+                while not ups[0].empty():
+                    ups[0].get_nowait()
+                rv.append(bounded.paused[node.transport])
+
+                ups[1].get_nowait()
+                rv.append(bounded.paused.get(node.transport))
+                return rv
+            finally:
+                node.transport.close()
+                await asyncio.sleep(0, loop=self.loop)
+
+        counts = self.loop.run_until_complete(run())
+        if counts is None:
+            self.skipTest("Datagram transport cannot pause reading.")
+        self.assertEqual([2, 1, None], counts)
+
+
+class PolicyMatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.token = token("file://{}".format(self.root.name), "test", "app")
+
+    def tearDown(self):
+        if os.path.isdir(self.root.name):
+            self.root.cleanup()
+        self.root = None
+
+    def test_no_flows(self):
+        policies = Policy(poa=["udp"], role=[], routing=["application"])
+        self.assertIsNone(match_policy(self.token, policies))
+
+    def test_match_single_flow(self):
+        list(Flow.create(self.token, poa=["udp"], role=[], routing=[]))
+        refs = list(Flow.create(self.token, poa=["udp"], role=[], routing=["application"]))
+        policies = Policy(poa=["udp"], role=[], routing=["application"])
+        rv = match_policy(self.token, policies)
+        self.assertEqual(["application", "udp"], [i.policy for i in rv])
+        self.assertEqual({refs[0].flow}, {i.flow for i in rv})
+
+    def test_node_class_cached(self):
+        class A:
+            pass
+
+        class B:
+            pass
+
+        self.assertIs(node_class((A, B)), node_class((A, B)))
+        self.assertIsNot(node_class((A, B)), node_class((B, A)))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import unittest
+
+from turberfield.ipc.pacing import socket_drops
+from turberfield.ipc.pacing import TokenBucket
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    class Clock:
+
+        def __init__(self):
+            self.now = 0
+
+        def __call__(self):
+            return self.now
+
+    def test_burst_then_pace(self):
+        clock = TokenBucketTests.Clock()
+        bucket = TokenBucket(rate=1000, burst=2000, clock=clock)
+        self.assertEqual(0, bucket.delay(1000))
+        self.assertEqual(0, bucket.delay(1000))
+        self.assertAlmostEqual(1.0, bucket.delay(1000))
+        self.assertAlmostEqual(2.0, bucket.delay(1000))
+
+    def test_refill_capped(self):
+        clock = TokenBucketTests.Clock()
+        bucket = TokenBucket(rate=1000, burst=2000, clock=clock)
+        bucket.delay(2000)
+        clock.now = 60
+        self.assertEqual(0, bucket.delay(2000))
+        self.assertAlmostEqual(0.5, bucket.delay(500))
+
+
+class SocketDropsTests(unittest.TestCase):
+
+    def test_udp_socket(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            rv = socket_drops(sock)
+            self.assertIn(rv, (None, 0))
+
+    def test_no_socket(self):
+        self.assertIsNone(socket_drops(None))
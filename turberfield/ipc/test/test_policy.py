@@ -17,9 +17,11 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import ipaddress
 import textwrap
 import unittest
 
+from turberfield.ipc.policy import POA
 from turberfield.ipc.policy import Routing
 from turberfield.ipc.types import Address
 
@@ -163,3 +165,15 @@ class PolicyTests(unittest.TestCase):
             Routing.Application.from_json(PolicyTests.routing),
             table
         )
+
+class MulticastTests(unittest.TestCase):
+
+    def test_allocate_group(self):
+        group = POA.Multicast.allocate()
+        self.assertTrue(ipaddress.IPv4Address(group.addr).is_multicast)
+        self.assertTrue(49152 <= group.port < 65535)
+
+    def test_allocate_shared(self):
+        first = POA.Multicast.allocate()
+        group = POA.Multicast.allocate(others=[None, first])
+        self.assertEqual((first.addr, first.port), (group.addr, group.port))
@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+
+# This file is part of turberfield.
+#
+# Turberfield is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Turberfield is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import argparse
+import asyncio
+from collections import Counter
+import configparser
+import io
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import textwrap
+import time
+import types
+import unittest
+
+from turberfield.ipc.proactor import Initiator
+from turberfield.ipc.proactor import JobTable
+from turberfield.ipc.proactor import PortPool
+from turberfield.ipc.proactor import Proactor
+from turberfield.ipc.proactor import referenced_sections
+from turberfield.ipc.proactor import Supervisor
+from turberfield.ipc.proactor import usage
+from turberfield.ipc.proactor import write_sections
+from turberfield.ipc.proactor import Zygote
+from turberfield.utils.misc import config_parser
+
+
+class PortPoolTests(unittest.TestCase):
+
+    def test_lowest_first(self):
+        pool = PortPool(8000, 8004, busy=[8001])
+        self.assertEqual([8000, 8002, 8003], [pool.allocate() for i in range(3)])
+        pool.release(8002)
+        pool.release(8000)
+        self.assertEqual([8000, 8002, 8004], [pool.allocate() for i in range(3)])
+        self.assertIsNone(pool.allocate())
+
+    def test_release_unknown(self):
+        pool = PortPool(8000, 8001)
+        pool.release(8000)
+        pool.release(9000)
+        self.assertFalse(pool.free)
+        self.assertEqual(8000, pool.allocate())
+
+    def test_take(self):
+        pool = PortPool(8000, 8002)
+        pool.take(8000)
+        self.assertIn(8000, pool)
+        self.assertEqual(8001, pool.allocate())
+
+    def test_hold(self):
+        now = [0]
+        pool = PortPool(8000, 8009, max_held=2, clock=lambda: now[0])
+        ports = [pool.allocate() for i in range(3)]
+        for port in ports:
+            pool.hold(port, seconds=10)
+        # The longest held is released early.
+        self.assertEqual([8001, 8002], list(pool.held))
+        self.assertEqual(8000, pool.allocate())
+
+        now[0] = 11
+        self.assertEqual(8001, pool.allocate())
+        self.assertFalse(pool.held)
+        self.assertNotIn(8002, pool)
+
+
+class SupervisorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.supervisor = Supervisor(
+            backoff=1, factor=2, max_backoff=5, limit=3, window=60,
+            clock=lambda: self.now
+        )
+
+    def test_backoff(self):
+        delays = [self.supervisor.exited("abc", 1, 0.1) for i in range(3)]
+        self.assertEqual([1, 2, 4], delays)
+        self.assertEqual("backoff", self.supervisor.state)
+        self.supervisor.started("abc")
+        self.assertEqual("ok", self.supervisor.state)
+
+    def test_finished(self):
+        self.assertIsNone(self.supervisor.exited("abc", 0, 0.1))
+        self.assertEqual("ok", self.supervisor.state)
+        self.assertEqual(1, len(self.supervisor.exits))
+
+    def test_crashloop(self):
+        for i in range(3):
+            self.supervisor.exited("abc", 1, 0.1)
+        self.assertIsNone(self.supervisor.exited("abc", 1, 0.1))
+        self.assertEqual("crashloop", self.supervisor.state)
+        self.supervisor.reset()
+        self.assertEqual(1, self.supervisor.exited("abc", 1, 0.1))
+
+    def test_crashloop_clears(self):
+        for i in range(4):
+            self.supervisor.exited("abc", 1, 0.1)
+        self.supervisor.started("def")
+        self.assertEqual("crashloop", self.supervisor.state)
+        self.now = 61
+        self.supervisor.started("def")
+        self.assertEqual("ok", self.supervisor.state)
+        self.assertEqual(1, self.supervisor.exited("def", 1, 0.1))
+
+    def test_window(self):
+        for i in range(3):
+            self.supervisor.exited("abc", 1, 0.1)
+        self.now = 61
+        self.assertEqual(1, self.supervisor.exited("abc", -9, 120))
+        self.assertEqual(4, len(self.supervisor.exits))
+
+
+class ConfigReaderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.proactor = Proactor(argparse.Namespace(guid="abc"), loop=self.loop)
+        self.r, self.w = os.pipe()
+        self.pipe = os.fdopen(self.r, "r")
+
+    def tearDown(self):
+        try:
+            os.close(self.w)
+        except OSError:
+            pass
+        self.pipe.close()
+        self.loop.close()
+
+    def write(self, chunks, interval, close=True):
+        for n, chunk in enumerate(chunks):
+            self.loop.call_later(
+                n * interval, os.write, self.w, chunk.encode("utf-8")
+            )
+        if close:
+            self.loop.call_later(len(chunks) * interval, os.close, self.w)
+
+    def test_idle_not_total(self):
+        chunks = ["[ab", "c]\nx = 1\n", "  continued\n[def]\n", "y = ${abc:x}\n"]
+        self.write(chunks, 0.1)
+        then = time.monotonic()
+        rv = self.loop.run_until_complete(
+            self.proactor.receive_config(self.pipe, timeout=0.3)
+        )
+        self.assertGreater(time.monotonic() - then, 0.3)
+        self.assertEqual(len("".join(chunks)), rv)
+        self.assertEqual("1\ncontinued", self.proactor.cfg["abc"]["x"])
+        self.assertEqual("1\ncontinued", self.proactor.cfg["def"]["y"])
+
+    def test_idle_timeout(self):
+        self.write(["[abc]\nx = 1\n", "[def]\n"], 0.1, close=False)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(
+                self.proactor.receive_config(self.pipe, timeout=0.2)
+            )
+        # Sections are parsed as soon as they are complete.
+        self.assertEqual("1", self.proactor.cfg["abc"]["x"])
+        self.assertFalse(self.proactor.cfg.has_section("def"))
+
+    def test_limit(self):
+        self.write(["[abc]\n", "x = {0}\n".format("x" * 200)], 0.05)
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                self.proactor.receive_config(self.pipe, timeout=1, limit=100)
+            )
+
+    def test_duplicate_section(self):
+        self.write(["[abc]\nx = 1\n", "[abc]\ny = 2\n"], 0.05)
+        with self.assertRaises(configparser.DuplicateSectionError):
+            self.loop.run_until_complete(
+                self.proactor.receive_config(self.pipe, timeout=1)
+            )
+
+    def test_not_a_pipe(self):
+        text = "[abc]\nx = 1\n"
+        rv = self.proactor.read_config(io.StringIO(text), timeout=1)
+        self.assertEqual(len(text), rv)
+        self.assertEqual("1", self.proactor.cfg["abc"]["x"])
+
+        with self.assertRaises(ValueError):
+            self.proactor.read_config(io.StringIO(text * 20), timeout=1, limit=100)
+
+
+class JobTableTests(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = JobTable(history=2)
+        self.module = types.ModuleType("test_job")
+
+    def test_index(self):
+        for guid in ("a", "b", "c"):
+            self.jobs.update(guid, "pending", module=self.module)
+        self.jobs.update("b", "running")
+        self.jobs.update("a", "running")
+
+        self.assertEqual(["a", "b", "c"], [i.guid for i in self.jobs])
+        self.assertEqual(["b", "a"], [i.guid for i in self.jobs.page("running")])
+        self.assertEqual(["c"], [i.guid for i in self.jobs.page("pending")])
+        self.assertEqual(
+            {"pending": 1, "running": 2, "failed": 0, "exited": 0},
+            self.jobs.counts()
+        )
+        self.assertIs(self.module, self.jobs["a"].module)
+        self.assertRaises(KeyError, self.jobs.page, "crashloop")
+
+    def test_page(self):
+        for i in range(10):
+            self.jobs.update(str(i), "running")
+        self.assertEqual(
+            ["3", "4", "5"], [i.guid for i in self.jobs.page(offset=3, limit=3)]
+        )
+        self.assertEqual(["9"], [i.guid for i in self.jobs.page("running", 9, 3)])
+        self.assertEqual([], self.jobs.page("running", 10, 3))
+
+    def test_history(self):
+        for guid in ("a", "b", "c"):
+            self.jobs.update(guid, "running")
+        self.jobs.update("a", "exited")
+        self.jobs.update("b", "failed")
+        self.jobs.update("c", "exited")
+        self.assertNotIn("a", self.jobs)
+        self.assertEqual(2, len(self.jobs))
+        self.assertEqual({"failed": 1, "exited": 1}, +Counter(self.jobs.counts()))
+
+        # A job which restarts is no longer finished.
+        self.jobs.update("b", "pending")
+        self.jobs.update("d", "exited")
+        self.assertEqual(["b", "c", "d"], [i.guid for i in self.jobs])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/stat"), "No /proc")
+    def test_usage(self):
+        rv = usage(os.getpid())
+        self.assertGreater(rv.rss, 0)
+        self.assertGreaterEqual(rv.threads, 1)
+        self.assertGreater(rv.cpu, 0)
+        self.assertIsNone(usage(None))
+
+    def test_summary(self):
+        process = types.SimpleNamespace(pid=os.getpid(), returncode=None)
+        worker = Initiator.Worker("a", 8081, None, self.module, process)
+        job = self.jobs.update("a", "running", module=self.module, worker=worker)
+        rv = self.jobs.summary(job)
+        self.assertEqual("test_job", rv["module"])
+        self.assertEqual(8081, rv["port"])
+        self.assertEqual(os.getpid(), rv["pid"])
+        if os.path.exists("/proc/self/stat"):
+            self.assertGreater(rv["usage"]["rss"], 0)
+
+        job = self.jobs.update("b", "pending", module=self.module)
+        rv = self.jobs.summary(job)
+        self.assertIsNone(rv["pid"])
+        self.assertIsNone(rv["usage"])
+
+
+class InitiatorTests(unittest.TestCase):
+
+    cfg = textwrap.dedent("""
+    [turberfield.ipc.demo.initiator]
+    listen_addr = 127.0.0.1
+    child_port_min = 49152
+    child_port_max = 49160
+
+    [abc]
+    listen_addr = ${turberfield.ipc.demo.initiator:listen_addr}
+    child_port_min = ${turberfield.ipc.demo.initiator:child_port_min}
+    child_port_max = ${turberfield.ipc.demo.initiator:child_port_max}
+    listen_port = 8080
+
+    [def]
+    listen_port = 49153
+    """)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.initiator = Initiator(argparse.Namespace(guid="abc"), loop=self.loop)
+        self.initiator.cfg.read_string(self.cfg)
+
+    def tearDown(self):
+        for task in self.initiator.tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.loop.close()
+
+    def test_port_pool(self):
+        pool = self.initiator.port_pool()
+        self.assertIs(pool, self.initiator.port_pool())
+        self.assertEqual(49152, pool.allocate())
+        self.assertEqual(49154, pool.allocate())
+        self.assertEqual(
+            49155,
+            Initiator.next_port(self.initiator.cfg, "abc", busy={49152, 49154})
+        )
+
+    def test_child_sections(self):
+        cfg = self.initiator.cfg
+        cfg.read_string(textwrap.dedent("""
+        [turberfield.ipc.demo.processor]
+        colour = blue
+
+        [ghi]
+        colour = ${turberfield.ipc.demo.processor:colour}
+        listen_port = 49155
+        parent_addr = ${abc:listen_addr}
+        """))
+        names = referenced_sections(cfg, "ghi")
+        self.assertEqual(
+            ["ghi", "turberfield.ipc.demo.processor", "abc", "turberfield.ipc.demo.initiator"],
+            names
+        )
+
+        text = write_sections(cfg, names, io.StringIO()).getvalue()
+        self.assertNotIn("[def]", text)
+        child = config_parser()
+        child.read_string(text)
+        self.assertEqual(dict(cfg.items("ghi")), dict(child.items("ghi")))
+        self.assertEqual("127.0.0.1", child.get("ghi", "parent_addr"))
+
+    def test_config_delta(self):
+        cfg = self.initiator.cfg
+        cfg.read_string("[ghi]\ncolour = blue\nsize = 3\n")
+        self.initiator.notify("ghi")
+        version = self.initiator.versions["ghi"]
+        self.assertEqual({}, self.initiator.config_delta("ghi", version))
+
+        cfg.set("ghi", "colour", "red")
+        cfg.remove_option("ghi", "size")
+        cfg.set("ghi", "shape", "round")
+        self.initiator.notify("ghi")
+        for i in range(2):
+            with self.subTest(i=i):
+                self.assertEqual(
+                    {"colour": "red", "size": None, "shape": "round"},
+                    self.initiator.config_delta("ghi", version)
+                )
+
+        full = {"colour": "red", "shape": "round"}
+        self.assertEqual(full, self.initiator.config_delta("ghi"))
+        self.assertEqual(full, self.initiator.config_delta("ghi", "stale"))
+        self.assertEqual(
+            {}, self.initiator.config_delta("ghi", self.initiator.versions["ghi"])
+        )
+
+    def test_config_history(self):
+        self.initiator.cfg.read_string("[ghi]\ncolour = blue\n")
+        self.initiator.notify("ghi")
+        version = self.initiator.versions["ghi"]
+        for i in range(Initiator.CONFIG_HISTORY):
+            self.initiator.cfg.set("ghi", "size", str(i))
+            self.initiator.notify("ghi")
+        self.assertEqual(Initiator.CONFIG_HISTORY, len(self.initiator.snapshots["ghi"]))
+        self.assertNotIn(version, self.initiator.snapshots["ghi"])
+        self.assertEqual(
+            {"colour": "blue", "size": str(Initiator.CONFIG_HISTORY - 1)},
+            self.initiator.config_delta("ghi", version)
+        )
+
+    def test_config_push(self):
+        cfg = self.initiator.cfg
+        cfg.read_string(textwrap.dedent("""
+        [ghi]
+        parent_addr = ${abc:listen_addr}
+        [jkl]
+        colour = blue
+        """))
+        for guid in ("ghi", "jkl"):
+            self.initiator.notify(guid)
+
+        async def run():
+            version, delta = await self.initiator.config_changes("ghi")
+            self.assertEqual(dict(cfg.items("ghi")), delta)
+            waiting = [
+                self.loop.create_task(self.initiator.config_changes(i, self.initiator.versions[i], 2))
+                for i in ("ghi", "jkl")
+            ]
+            await asyncio.sleep(0, loop=self.loop)
+            then = time.monotonic()
+            self.initiator.configure("turberfield.ipc.demo.initiator", listen_addr="0.0.0.0")
+            rv = await waiting[0]
+            self.assertLess(time.monotonic() - then, 0.1)
+            self.assertFalse(waiting[1].done())
+            waiting[1].cancel()
+            await asyncio.wait([waiting[1]], loop=self.loop)
+            return version, rv
+
+        version, (current, delta) = self.loop.run_until_complete(run())
+        self.assertNotEqual(version, current)
+        self.assertEqual({"parent_addr": "0.0.0.0"}, delta)
+        self.assertFalse(self.initiator.waiters["jkl"])
+
+        # A job which retries with the same ETag is sent the same delta.
+        rv = self.loop.run_until_complete(self.initiator.config_changes("ghi", version))
+        self.assertEqual((current, {"parent_addr": "0.0.0.0"}), rv)
+
+    def test_config_timeout(self):
+        self.initiator.cfg.read_string("[ghi]\ncolour = blue\n")
+        self.initiator.notify("ghi")
+        version = self.initiator.versions["ghi"]
+        rv = self.loop.run_until_complete(
+            self.initiator.config_changes("ghi", version, timeout=0.05)
+        )
+        self.assertEqual((version, None), rv)
+        with self.assertRaises(KeyError):
+            self.loop.run_until_complete(self.initiator.config_changes("xyz"))
+
+    def test_ready(self):
+        self.initiator.cfg.read_string("[ghi]\nlisten_port = 49155\n")
+        self.initiator.args.guid = "ghi"
+        stream = io.StringIO()
+        self.initiator.ready(stream=stream)
+        self.initiator.ready("127.0.0.1", 49156, stream=stream)
+        self.assertEqual(
+            ["bound on 0.0.0.0:49155", "bound on 127.0.0.1:49156"],
+            stream.getvalue().splitlines()
+        )
+        match = Initiator.bound.match(stream.getvalue().splitlines()[-1])
+        self.assertEqual(("127.0.0.1", "49156"), match.group("addr", "port"))
+
+    def test_release_probes_port(self):
+        initiator = self.initiator
+        pool = initiator.port_pool()
+        port = pool.allocate()
+        initiator.cfg.read_string("[ghi]\nlisten_addr = 127.0.0.1\n")
+        initiator.notify("ghi")
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", port))
+            sock.listen(1)
+            initiator.release("ghi", port, probe=True)
+        self.assertIn(port, pool)
+        self.assertEqual([port], list(pool.held))
+        self.assertNotIn("ghi", initiator.snapshots)
+        self.assertNotIn("ghi", initiator.versions)
+
+        other = pool.allocate()
+        initiator.release("ghi", other, probe=True)
+        self.assertNotIn(other, pool)
+
+    def test_reap_releases_port(self):
+        initiator = self.initiator
+        pool = initiator.port_pool()
+        port = pool.allocate()
+        initiator.cfg.read_string("[ghi]\nlisten_port = {0}\n".format(port))
+
+        async def run():
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", "pass", loop=self.loop
+            )
+            worker = Initiator.Worker(
+                "ghi", port, None, types.ModuleType("pass_job"), proc
+            )
+            initiator.jobs.update("ghi", "running", module=worker.module, worker=worker)
+            await initiator.reap(worker)
+
+        self.loop.run_until_complete(run())
+        self.assertNotIn(port, pool)
+        self.assertEqual("exited", initiator.jobs["ghi"].state)
+        self.assertEqual(0, initiator.jobs["ghi"].worker.process.returncode)
+        self.assertFalse(initiator.cfg.has_section("ghi"))
+        self.assertEqual(port, pool.allocate())
+        exit = self.initiator.supervisors["pass_job"].exits[-1]
+        self.assertEqual(("ghi", 0), (exit.guid, exit.code))
+
+
+class LaunchTests(unittest.TestCase):
+
+    module = textwrap.dedent("""
+    import argparse
+    import sys
+    import time
+
+    def main():
+        p = argparse.ArgumentParser()
+        p.add_argument("--guid")
+        p.add_argument("--port", type=int)
+        p.add_argument("--delay", type=float, default=1.0)
+        args = p.parse_args()
+        sys.stdin.read()
+        print("starting", flush=True)
+        time.sleep(args.delay)
+        print("bound on 127.0.0.1:{0}".format(args.port + 100), flush=True)
+        time.sleep(10)
+
+    if __name__ == "__main__":
+        main()
+    """)
+
+    parent_job = textwrap.dedent("""
+    import argparse
+    import multiprocessing
+    import sys
+    import time
+
+    def main():
+        p = argparse.ArgumentParser()
+        p.add_argument("--guid")
+        p.add_argument("--port", type=int)
+        args = p.parse_args()
+        sys.stdin.read()
+        child = multiprocessing.get_context("fork").Process(target=time.sleep, args=(0,))
+        child.start()
+        child.join()
+        print("bound on 127.0.0.1:{0}".format(args.port), flush=True)
+        time.sleep(10)
+
+    if __name__ == "__main__":
+        main()
+    """)
+
+    @classmethod
+    def setUpClass(cls):
+        # A Zygote's forkserver starts once, with the PYTHONPATH it sees first.
+        cls.root = tempfile.TemporaryDirectory()
+        with open(os.path.join(cls.root.name, "slow_job.py"), "w") as output:
+            output.write(cls.module)
+        with open(os.path.join(cls.root.name, "parent_job.py"), "w") as output:
+            output.write(cls.parent_job)
+        cls.path = os.environ.get("PYTHONPATH")
+        os.environ["PYTHONPATH"] = os.pathsep.join(
+            i for i in (cls.root.name, cls.path) if i
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.path is None:
+            del os.environ["PYTHONPATH"]
+        else:
+            os.environ["PYTHONPATH"] = cls.path
+        cls.root.cleanup()
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.initiator = Initiator(argparse.Namespace(guid="abc"), loop=self.loop)
+        self.initiator.cfg.read_string(InitiatorTests.cfg)
+
+    def tearDown(self):
+        for job in self.initiator.jobs.page("running"):
+            job.worker.process.kill()
+        for task in self.initiator.tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0.1, loop=self.loop))
+        self.loop.close()
+
+    def test_crashloop(self):
+        module = types.ModuleType("crash_job")
+        with open(os.path.join(self.root.name, "crash_job.py"), "w") as output:
+            output.write("import sys\nsys.exit(3)\n")
+        self.initiator.supervisors["crash_job"] = Supervisor(
+            backoff=0.01, limit=2, window=10
+        )
+        taken = set(self.initiator.port_pool().taken)
+        calls = []
+        worker = self.initiator.worker
+
+        def record(module, guid, **kwargs):
+            calls.append(kwargs)
+            return worker(module, guid, **kwargs)
+
+        self.initiator.worker = record
+
+        async def run():
+            guid = await self.initiator.launch(module, colour="red")
+            while self.initiator.jobs[guid].state != "failed":
+                await asyncio.sleep(0.05, loop=self.loop)
+            return guid
+
+        guid = self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        supervisor = self.initiator.supervisors["crash_job"]
+        self.assertEqual("crashloop", supervisor.state)
+        self.assertEqual([3, 3, 3], [i.code for i in supervisor.exits])
+        self.assertEqual([{"colour": "red"}] * 3, calls)
+        self.assertEqual(3, self.initiator.metrics["crash_job"].failed)
+        self.assertEqual(3, self.initiator.jobs[guid].worker.process.returncode)
+        self.assertEqual({"failed": 1}, +Counter(self.initiator.jobs.counts()))
+        self.assertReleased(taken)
+
+    def assertReleased(self, taken):
+        self.assertEqual(taken, self.initiator.port_pool().taken)
+        self.assertFalse(self.initiator.port_pool().held)
+        for attr in ("snapshots", "versions", "started"):
+            with self.subTest(attr=attr):
+                self.assertFalse(getattr(self.initiator, attr))
+
+    def test_launch_error(self):
+        module = types.ModuleType("slow_job")
+        taken = set(self.initiator.port_pool().taken)
+
+        async def run():
+            guid = await self.initiator.launch(module, interpreter="/no/such/python")
+            while self.initiator.jobs[guid].state != "failed":
+                await asyncio.sleep(0.05, loop=self.loop)
+
+        self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        self.assertReleased(taken)
+
+    def test_ready_timeout(self):
+        module = types.ModuleType("slow_job")
+        self.initiator.READY_TIMEOUT_SEC = 0.2
+        self.initiator.supervisors["slow_job"] = Supervisor(backoff=0.01, limit=1)
+        taken = set(self.initiator.port_pool().taken)
+
+        async def run():
+            guid = await self.initiator.launch(module)
+            while self.initiator.jobs[guid].state != "failed":
+                await asyncio.sleep(0.05, loop=self.loop)
+            return guid
+
+        guid = self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        self.assertEqual(-9, self.initiator.jobs[guid].worker.process.returncode)
+        self.assertEqual(2, self.initiator.metrics["slow_job"].failed)
+        self.assertReleased(taken)
+
+    def test_concurrent_launch(self):
+        module = types.ModuleType("slow_job")
+
+        async def run():
+            guids = [await self.initiator.launch(module) for i in range(4)]
+            while not all(self.initiator.jobs[i].state == "running" for i in guids):
+                await asyncio.sleep(0.05, loop=self.loop)
+            return [self.initiator.jobs[i].worker for i in guids]
+
+        then = time.monotonic()
+        workers = self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        self.assertLess(time.monotonic() - then, 3.5)
+        self.assertEqual(4, len({i.port for i in workers}))
+        self.assertTrue(all(i.process.returncode is None for i in workers))
+
+        # Jobs report the port they actually bound to.
+        pool = self.initiator.port_pool()
+        for worker in workers:
+            self.assertIn(worker.port, pool)
+            self.assertNotIn(worker.port - 100, pool)
+            self.assertEqual(worker.port, self.initiator.cfg.getint(worker.guid, "listen_port"))
+            version, delta = self.loop.run_until_complete(
+                self.initiator.config_changes(worker.guid)
+            )
+            self.assertEqual(str(worker.port), delta["listen_port"])
+
+        metrics = self.initiator.metrics["slow_job"]
+        self.assertEqual(4, metrics.ready)
+        self.assertEqual(0, metrics.failed)
+        self.assertGreaterEqual(metrics.min, 1.0)
+
+    @unittest.skipUnless(
+        "forkserver" in multiprocessing.get_all_start_methods(), "No forkserver"
+    )
+    def test_zygote_launch(self):
+        module = types.ModuleType("slow_job")
+        self.initiator.zygote = Zygote(self.loop, preload=["slow_job", "parent_job"])
+
+        async def run():
+            guids = [await self.initiator.launch(module) for i in range(2)]
+            while not all(self.initiator.jobs[i].state == "running" for i in guids):
+                await asyncio.sleep(0.05, loop=self.loop)
+            return [self.initiator.jobs[i].worker for i in guids]
+
+        workers = self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        self.assertEqual(2, len({i.process.pid for i in workers}))
+        self.assertTrue(all(i.process.returncode is None for i in workers))
+
+        worker = workers[0]
+        worker.process.kill()
+        self.loop.run_until_complete(
+            asyncio.wait_for(worker.process.wait(), timeout=2, loop=self.loop)
+        )
+        self.assertEqual(-9, worker.process.returncode)
+
+    @unittest.skipUnless(
+        "forkserver" in multiprocessing.get_all_start_methods(), "No forkserver"
+    )
+    def test_zygote_job_has_children(self):
+        module = types.ModuleType("parent_job")
+        self.initiator.zygote = Zygote(self.loop, preload=["slow_job", "parent_job"])
+
+        async def run():
+            guid = await self.initiator.launch(module)
+            while self.initiator.jobs[guid].state == "pending":
+                await asyncio.sleep(0.05, loop=self.loop)
+            return self.initiator.jobs[guid]
+
+        job = self.loop.run_until_complete(
+            asyncio.wait_for(run(), timeout=10, loop=self.loop)
+        )
+        self.assertEqual("running", job.state)
+        self.assertFalse(job.worker.process.process.daemon)
+        self.assertNotIn(job.worker.process.process, multiprocessing.active_children())
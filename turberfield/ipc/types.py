@@ -17,6 +17,7 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import namedtuple
+import functools
 
 from turberfield.utils.assembly import Assembly
 
@@ -40,3 +41,14 @@ A semantically hierarchical address for distributed networking.
 """.format(Address.__doc__)
 
 Assembly.register(Address)
+
+@functools.lru_cache(maxsize=1024)
+def address_of(token):
+    """
+    Returns the :py:class:`Address <turberfield.ipc.types.Address>` of a DIF token.
+
+    Addresses are interned; the same token always gives the same object,
+    so they may be compared by identity before value.
+
+    """
+    return Address(*(getattr(token, i, None) for i in Address._fields))
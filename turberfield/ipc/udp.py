@@ -17,73 +17,382 @@
 # along with turberfield.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+from collections import Counter
+from collections import deque
 import concurrent.futures
 import functools
+import itertools
+import random
+import socket
 import warnings
 
+from turberfield.ipc.correlation import Correlator
 from turberfield.ipc.flow import Flow
+from turberfield.ipc.fragment import fragment
+from turberfield.ipc.fragment import Reassembly
+from turberfield.ipc.message import dumps
 from turberfield.ipc.netstrings import dumpb
 from turberfield.ipc.netstrings import loadb
 from turberfield.ipc.node import TakesPolicy
+from turberfield.ipc.pacing import socket_drops
+from turberfield.ipc.pacing import TokenBucket
+from turberfield.ipc.types import address_of
 
 from turberfield.utils.assembly import Assembly
 
 class UDPAdapter(asyncio.DatagramProtocol):
 
-    def __init__(self, loop, token, types, *args, **kwargs):
+    MTU = 1400
+    FRAGMENT_TIMEOUT_SEC = 5
+    BURST_BYTES = 64 * 1024
+    BACKLOG = 256
+    DECODE_THRESHOLD = 16 * 1024
+
+    def __init__(
+        self, loop, token, types, *args, rate=None, burst=None, executor=None, **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.loop = loop
         self.token = token
         self.types = types
         self.decoder = loadb(encoding="utf-8")
         self.decoder.send(None)
+        self.reassembly = Reassembly(timeout=self.FRAGMENT_TIMEOUT_SEC, mtu=self.MTU)
+        self.ids = itertools.count(random.getrandbits(48))
+        self.rate = rate
+        self.burst = burst or self.BURST_BYTES
+        self.pacers = {}
+        self.backlogs = {}
+        self.stats = Counter()
+        self.executor = executor
+        self.decoding = {}
+        self.groups = []
         self.transport = None
 
     def hop(self, token, msg, policy):
         raise NotImplementedError
 
+    def route(self, token, application, policy):
+        hop = next(Flow.find(token, application=application, policy=policy), None)
+        return Flow.inspect(hop) if hop is not None else None
+
     def connection_made(self, transport):
         self.transport = transport
 
+    def sendto(self, packet, remote_addr):
+        """
+        Sends a packet, fragmenting it if it exceeds the MTU.
+
+        """
+        for datagram in fragment(packet, next(self.ids), mtu=self.MTU):
+            self.transport.sendto(datagram, remote_addr)
+
+    def pace(self, poa, rate, burst=None):
+        """
+        Sets the rate in bytes per second at which to send to a peer POA.
+        A rate of `None` sends to that peer without pacing.
+
+        """
+        self.pacers[(poa.addr, poa.port)] = (
+            TokenBucket(rate, burst or self.burst) if rate else None
+        )
+
+    def pacer(self, poa):
+        key = (poa.addr, poa.port)
+        try:
+            return self.pacers[key]
+        except KeyError:
+            rv = self.pacers[key] = (
+                TokenBucket(self.rate, self.burst) if self.rate else None
+            )
+            return rv
+
+    def delay(self, poa, packet):
+        pacer = self.pacer(poa)
+        return pacer.delay(len(packet)) if pacer is not None else 0
+
+    def post(self, poa, packet):
+        """
+        Sends a packet to a peer POA at the pace set for it. Packets which
+        must wait are kept in order in a backlog for that peer, which one
+        timer drains. Returns `False` if the packet is dropped because the
+        backlog already holds `BACKLOG` packets. The attribute `stats`
+        counts those drops.
+
+        """
+        remote_addr = (poa.addr, poa.port)
+        backlog = self.backlogs.get(remote_addr)
+        if backlog is not None:
+            if len(backlog) >= self.BACKLOG:
+                self.stats["dropped"] += 1
+                return False
+            backlog.append(packet)
+            return True
+
+        delay = self.delay(poa, packet)
+        if delay:
+            self.backlogs[remote_addr] = deque([packet])
+            self.loop.call_later(delay, self.drain, poa)
+        else:
+            self.sendto(packet, remote_addr)
+        return True
+
+    def drain(self, poa):
+        remote_addr = (poa.addr, poa.port)
+        backlog = self.backlogs[remote_addr]
+        if self.transport is None or self.transport.is_closing():
+            del self.backlogs[remote_addr]
+            return
+
+        # The head of the backlog has already been paced.
+        self.sendto(backlog.popleft(), remote_addr)
+        while backlog:
+            delay = self.delay(poa, backlog[0])
+            if delay:
+                self.loop.call_later(delay, self.drain, poa)
+                return
+            self.sendto(backlog.popleft(), remote_addr)
+        del self.backlogs[remote_addr]
+
+    @asyncio.coroutine
+    def join(self, group, iface="127.0.0.1"):
+        """
+        Receives the datagrams sent to a multicast group.
+
+        :param group: A :py:class:`POA.Multicast <turberfield.ipc.policy.POA.Multicast>` object.
+        :param iface: The address of the interface on which to join.
+
+        """
+        transport, listener = yield from self.loop.create_datagram_endpoint(
+            lambda:GroupListener(self), sock=group_socket(group, iface)
+        )
+        self.groups.append(transport)
+        return transport
+
+    def drops(self):
+        """
+        Returns the count of datagrams dropped by the kernel on this
+        node's socket, or `None` if the OS does not report it.
+
+        """
+        if self.transport is None:
+            return None
+        return socket_drops(self.transport.get_extra_info("socket"))
+
     def datagram_received(self, data, addr):
         """
         Routing only. Provides no upward service.
 
+        Packets larger than `DECODE_THRESHOLD` are decoded by the executor
+        if there is one. Messages from each sender are handled in the order
+        they arrived.
+
         """
+        data = self.reassembly.receive(data, addr)
+        if data is None:
+            return (None, None)
+
         packet = self.decoder.send(data)
         if packet is None:
             return (None, None)
 
-        msg = Assembly.loads(packet)
+        if self.executor is not None and len(packet) > self.DECODE_THRESHOLD:
+            job = self.loop.run_in_executor(self.executor, Assembly.loads, packet)
+        elif addr in self.decoding:
+            # Keep order behind earlier messages from this sender.
+            job = self.loop.create_future()
+            job.set_result(Assembly.loads(packet))
+        else:
+            return self.received(Assembly.loads(packet), addr)
+
+        self.decoding.setdefault(addr, deque([])).append(job)
+        job.add_done_callback(functools.partial(self.decoded, addr))
+        return (None, None)
+
+    def decoded(self, addr, job=None):
+        jobs = self.decoding.get(addr, ())
+        while jobs and jobs[0].done():
+            job = jobs.popleft()
+            try:
+                self.received(job.result(), addr)
+            except Exception as e:
+                warnings.warn(repr(getattr(e, "args", e) or e))
+        if not jobs:
+            self.decoding.pop(addr, None)
+
+    def received(self, msg, addr):
         poa, msg = self.hop(self.token, msg, policy="udp")
         if poa is not None:
-            remote_addr = (poa.addr, poa.port)
-            data = Assembly.dumps(msg)
-            packet = dumpb(data)
-            self.transport.sendto(packet, remote_addr)
+            self.post(poa, dumpb(Assembly.dumps(msg)))
         return (poa, msg)
 
     def error_received(self, exc):
         warnings.warn(exc)
 
     def connection_lost(self, exc):
+        for group in self.groups:
+            group.close()
         warnings.warn("Socket closed.")
 
+class GroupListener(asyncio.DatagramProtocol):
+    """
+    Receives the datagrams sent to a multicast group, and passes
+    them on to a node.
+
+    """
+
+    def __init__(self, node):
+        self.node = node
+
+    def datagram_received(self, data, addr):
+        self.node.datagram_received(data, addr)
+
+    def error_received(self, exc):
+        warnings.warn(exc)
+
+def group_socket(group, iface="127.0.0.1"):
+    """
+    Returns a UDP socket which has joined a multicast group.
+
+    :param group: A :py:class:`POA.Multicast <turberfield.ipc.policy.POA.Multicast>` object.
+    :param iface: The address of the interface on which to join.
+
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", group.port))
+    sock.setsockopt(
+        socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+        socket.inet_aton(group.addr) + socket.inet_aton(iface)
+    )
+    sock.setblocking(False)
+    return sock
+
 class UDPService(UDPAdapter, TakesPolicy):
 
-    def __init__(self, loop, token, types, down=None, up=None, *args, **kwargs):
+    REQUEST_TIMEOUT_SEC = 5
+    REQUEST_MAX = 1024
+
+    def __init__(
+        self, loop, token, types, down=None, up=None, *args, dispatcher=None, **kwargs
+    ):
         super().__init__(loop, token, types, *args, **kwargs)
         self.down = down
         self.up = up
+        self.dispatcher = dispatcher
+        self.replies = Correlator(
+            loop, maxsize=self.REQUEST_MAX, timeout=self.REQUEST_TIMEOUT_SEC
+        )
 
-    def datagram_received(self, data, addr):
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        attach = getattr(self.up, "attach", None)
+        if attach is not None:
+            attach(transport)
+
+    def connection_lost(self, exc):
+        detach = getattr(self.up, "detach", None)
+        if detach is not None:
+            detach(self.transport)
+        super().connection_lost(exc)
+
+    def received(self, msg, addr):
         """
         Extends routing function to serve messages upward.
 
         """
-        poa, msg = super().datagram_received(data, addr)
+        poa, msg = super().received(msg, addr)
+        if poa is None and msg is not None and not self.replies.resolve(msg):
+            self.deliver(msg)
+        return (poa, msg)
+
+    def request(self, msg, timeout=None):
+        """
+        Sends a message, and returns a future which resolves to its reply.
+        See :py:mod:`correlation <turberfield.ipc.correlation>`.
+
+        :param msg: A Message object.
+        :param timeout: The time in seconds to wait for a reply. If `None`,
+                        the node's `REQUEST_TIMEOUT_SEC`.
+
+        Raises `asyncio.QueueFull` if the `down` queue has no room.
+
+        """
+        rv = self.replies.expect(msg, timeout)
+        try:
+            self.down.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.replies.discard(msg.header.id)
+            raise
+        return rv
+
+    def deliver(self, msg):
+        """
+        Serves a message upward. This runs on the event loop thread, so
+        the message goes straight to its handlers or into the `up` queue.
+
+        """
+        if self.dispatcher is None or not self.dispatcher(msg):
+            self.up.put_nowait(msg)
+
+    def local(self, address):
+        """
+        Returns `True` if an address is served by this node.
+
+        """
+        here = address_of(self.token)
+        return address is here or address == here
+
+    @asyncio.coroutine
+    def send(self, job, token=None, cache=None):
+        """
+        Routes a message from this node and sends it.
+
+        :param job: A Message object.
+        :param token: An optional DIF token to send as.
+        :param cache: An optional dictionary of encoded payloads,
+                      as used by :py:func:`turberfield.ipc.message.dumps`.
+
+        """
+        token = token or self.token
+        poa, msg = self.hop(token, job, policy="udp")
+        if job.header.via is not None:
+            # User-defined route
+            poa = self.route(token, job.header.via.application, "udp")
+
+        if poa is None:
+            if msg is not None and self.local(msg.header.dst):
+                if not self.replies.resolve(msg):
+                    self.deliver(msg)
+            else:
+                warnings.warn("Message expired.")
+            return
+
         if msg is not None:
-            self.loop.call_soon_threadsafe(functools.partial(self.up.put_nowait, msg))
+            if not self.post(poa, dumpb(dumps(msg, cache))):
+                warnings.warn("Backlog full; message dropped.")
+        else:
+            warnings.warn("No message from hop.")
+
+    @asyncio.coroutine
+    def send_batch(self, msgs, token=None):
+        """
+        Sends a sequence of messages, encoding each distinct payload
+        only once. Messages made by
+        :py:func:`parcel_many <turberfield.ipc.message.parcel_many>` share
+        a payload.
+
+        A list of messages put on the `down` queue is sent this way too.
+
+        """
+        cache = {}
+        for msg in msgs:
+            try:
+                yield from self.send(msg, token, cache)
+            except Exception as e:
+                warnings.warn(repr(getattr(e, "args", e) or e))
 
     @asyncio.coroutine
     def __call__(self, token=None):
@@ -91,28 +400,10 @@ class UDPService(UDPAdapter, TakesPolicy):
         while True:
             try:
                 job = yield from self.down.get()
-
-                poa, msg = self.hop(token, job, policy="udp")
-                if job.header.via is not None:
-                    # User-defined route
-                    hop = next(Flow.find(
-                        token,
-                        application=job.header.via.application,
-                        policy="udp"),
-                    None)
-                    poa = Flow.inspect(hop)
-
-                if poa is None:
-                    warnings.warn("Message expired.")
-                    continue
-
-                if msg is not None:
-                    remote_addr = (poa.addr, poa.port)
-                    data = Assembly.dumps(msg)
-                    packet = dumpb(data)
-                    self.transport.sendto(packet, remote_addr)
+                if isinstance(job, list):
+                    yield from self.send_batch(job, token)
                 else:
-                    warnings.warn("No message from hop.")
+                    yield from self.send(job, token)
 
             except concurrent.futures.CancelledError:
                 break